@@ -1,14 +1,32 @@
+import eventlet
+
+# Patch sockets, locks and time before anything else imports them, so blocking
+# PyMySQL and OpenAI I/O yields to other greenlets instead of stalling the hub.
+eventlet.monkey_patch()
+
+import atexit
+import hashlib
+import heapq
+import hmac
 import json
 import math
 import os
 import random
+import signal
+import socket
+import threading
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from typing import Optional
 
 from dotenv import load_dotenv
+from eventlet import wsgi as eventlet_wsgi
 
 from flask import Flask, render_template, request, redirect, url_for, session, flash
-from flask_socketio import SocketIO, join_room, leave_room, emit, disconnect
+from flask_socketio import SocketIO, join_room, leave_room, disconnect
 from werkzeug.security import generate_password_hash, check_password_hash
 
 import db_utils
@@ -28,13 +46,43 @@ try:
 except ImportError:  # pragma: no cover - optional dependency path
     openai_module = None
 
+try:
+    import redis
+    from flask_session import Session
+except ImportError:  # pragma: no cover - optional dependency path
+    redis = None
+    Session = None
+
 # --- Basic Flask setup ---
 load_dotenv()
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "change-me-in-prod")
 
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+# Server-side sessions in Redis when REDIS_URL is set (needs Flask-Session and redis);
+# otherwise Flask's default signed-cookie sessions are used.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    if Session is None:
+        raise RuntimeError("REDIS_URL is set but Flask-Session and redis are not installed.")
+    app.config.update(SESSION_TYPE="redis", SESSION_REDIS=redis.Redis.from_url(REDIS_URL))
+    Session(app)
+
+# Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://...) so external emitters such as worker scripts
+# can push events to connected clients. Run exactly one game process behind it: players,
+# room occupancy, mobs and loot live in this process's memory, and the occupancy-based
+# emit skips (solo-room chat, room_has_players) would drop events for another process's clients.
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode="eventlet",
+    message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE"),
+    # Socket handlers only read the session. With Redis sessions they read the shared
+    # store directly, so logins and character switches made over HTTP show up live.
+    manage_session=not REDIS_URL,
+)
+
+_rng = random.Random()  # dedicated generator for dice, loot and spawn rolls
 
 # --- Multi-zone world definition (loaded from MariaDB) ---
 DEFAULT_ZONE = "village"
@@ -47,6 +95,8 @@ DIRECTION_VECTORS = {
     "east": (1, 0),
 }
 
+ADJACENT_DIRECTIONS = tuple((direction.title(), vector) for direction, vector in DIRECTION_VECTORS.items())
+
 DOOR_DEFINITIONS = {
     "village_town_hall_service": {
         "name": "Town Hall Service Door",
@@ -70,11 +120,16 @@ DOOR_DEFINITIONS = {
 
 DOORS = {}
 DOOR_ENDPOINT_LOOKUP = {}
+# Zobrist hash of which doors are open: XOR of the random key of every open door.
+door_state_hash = 0
 
 
 def initialize_doors():
+    global door_state_hash
+    door_state_hash = 0
     for door_id, spec in DOOR_DEFINITIONS.items():
         endpoints = []
+        endpoint_index = {}  # (zone, x, y) -> direction the door faces from that room
         for endpoint in spec.get("endpoints", []):
             coords = tuple(endpoint["coords"])
             record = {
@@ -83,6 +138,7 @@ def initialize_doors():
                 "direction": endpoint["direction"],
             }
             endpoints.append(record)
+            endpoint_index.setdefault((record["zone"], coords[0], coords[1]), record["direction"])
             DOOR_ENDPOINT_LOOKUP[(record["zone"], coords[0], coords[1], record["direction"])] = door_id
         DOORS[door_id] = {
             "id": door_id,
@@ -90,7 +146,19 @@ def initialize_doors():
             "description": spec["description"],
             "state": spec.get("initial_state", "closed"),
             "endpoints": endpoints,
+            "endpoint_index": endpoint_index,
+            "broadcast_rooms": tuple(endpoint_index),
+            "zobrist": _rng.getrandbits(64),
         }
+        if DOORS[door_id]["state"] == "open":
+            door_state_hash ^= DOORS[door_id]["zobrist"]
+
+
+def set_door_state(door, state):
+    global door_state_hash
+    if (door.get("state") == "open") != (state == "open"):
+        door_state_hash ^= door["zobrist"]
+    door["state"] = state
 
 
 initialize_doors()
@@ -266,16 +334,15 @@ CLASSES = {
 
 RACE_OPTIONS = list(RACES.keys())
 CLASS_OPTIONS = list(CLASSES.keys())
+# Case-folded key -> canonical key, for normalize_choice.
+RACE_LOOKUP = {key.lower(): key for key in RACES}
+CLASS_LOOKUP = {key.lower(): key for key in CLASSES}
 
 
-def normalize_choice(value, valid, default_value):
+def normalize_choice(value, lookup, default_value):
     if not value:
         return default_value
-    value = value.strip()
-    for key in valid.keys():
-        if key.lower() == value.lower():
-            return key
-    return default_value
+    return lookup.get(value.strip().lower(), default_value)
 
 
 def _weapon_template_map():
@@ -317,7 +384,9 @@ def get_weapon(key):
     }
 
 
+@lru_cache(maxsize=None)
 def format_weapon_payload(key):
+    """Weapon templates are static, so each key is resolved once; callers must not mutate the result."""
     weapon = get_weapon(key)
     dice = weapon.get("dice") or (1, 1)
     return {
@@ -337,12 +406,12 @@ def get_spell(key):
 
 
 def get_spells_for_class(class_name):
-    canonical = normalize_choice(class_name, CLASSES, DEFAULT_CLASS)
+    canonical = normalize_choice(class_name, CLASS_LOOKUP, DEFAULT_CLASS)
     return list(dict.fromkeys(CLASS_SPELLS.get(canonical, [])))
 
 
 def default_inventory_for_class(class_name):
-    char_class = normalize_choice(class_name, CLASSES, DEFAULT_CLASS)
+    char_class = normalize_choice(class_name, CLASS_LOOKUP, DEFAULT_CLASS)
     return list(dict.fromkeys(CLASSES[char_class].get("starting_weapons", []) + [DEFAULT_WEAPON_KEY]))
 
 
@@ -387,6 +456,7 @@ def deserialize_items(payload):
     return [part.strip() for part in str(payload).split(",") if part.strip() in templates]
 
 
+@lru_cache(maxsize=None)
 def format_item_payload(key):
     item = db_utils.get_item_template(key)
     if not item:
@@ -407,13 +477,17 @@ def ensure_equipped_weapon(equipped_key, inventory):
     return DEFAULT_WEAPON_KEY
 
 
-def roll_4d6_drop_lowest():
-    rolls = sorted([random.randint(1, 6) for _ in range(4)], reverse=True)
-    return sum(rolls[:3])
+D6_FACES = (1, 2, 3, 4, 5, 6)
 
 
 def generate_base_scores():
-    return {ability: roll_4d6_drop_lowest() for ability in ABILITY_KEYS}
+    # One bulk draw for all six abilities, sliced into groups of four.
+    rolls = _rng.choices(D6_FACES, k=4 * len(ABILITY_KEYS))
+    scores = {}
+    for index, ability in enumerate(ABILITY_KEYS):
+        group = rolls[index * 4:index * 4 + 4]
+        scores[ability] = sum(group) - min(group)
+    return scores
 
 
 def apply_race_modifiers(scores, race_name):
@@ -429,13 +503,14 @@ def ability_modifier(score):
     return (score - 10) // 2
 
 
+@lru_cache(maxsize=None)
 def format_dice(dice):
     return f"{dice[0]}d{dice[1]}"
 
 
 def build_character_sheet(race_choice, class_choice, base_scores=None):
-    race = normalize_choice(race_choice, RACES, DEFAULT_RACE)
-    char_class = normalize_choice(class_choice, CLASSES, DEFAULT_CLASS)
+    race = normalize_choice(race_choice, RACE_LOOKUP, DEFAULT_RACE)
+    char_class = normalize_choice(class_choice, CLASS_LOOKUP, DEFAULT_CLASS)
     if base_scores:
         base_scores = {ability: int(base_scores.get(ability, 10)) for ability in ABILITY_KEYS}
     else:
@@ -470,8 +545,8 @@ def build_character_sheet(race_choice, class_choice, base_scores=None):
 
 
 def derive_character_from_record(record):
-    race = normalize_choice(record.get("species") or record.get("race"), RACES, DEFAULT_RACE)
-    char_class = normalize_choice(record.get("class") or record.get("char_class"), CLASSES, DEFAULT_CLASS)
+    race = normalize_choice(record.get("species") or record.get("race"), RACE_LOOKUP, DEFAULT_RACE)
+    char_class = normalize_choice(record.get("class") or record.get("char_class"), CLASS_LOOKUP, DEFAULT_CLASS)
     class_data = CLASSES[char_class]
     abilities = {ability: record.get(f"{ability}_score") or 10 for ability in ABILITY_KEYS}
     ability_mods = {ability: ability_modifier(score) for ability, score in abilities.items()}
@@ -507,28 +582,47 @@ def derive_character_from_record(record):
 
 
 def clamp_hp(value, max_hp):
+    """Clamp an int HP value into ``[0, max_hp]``; ``None`` means full health."""
     if value is None:
         return max_hp
-    return max(0, min(int(value), max_hp))
+    if value < 0:
+        return 0
+    return max_hp if value > max_hp else value
 
 
-def roll_weapon_damage(weapon, ability_mod, crit=False, bonus_damage=0):
-    dice_count, dice_size = weapon["dice"]
-    total_dice = dice_count * (2 if crit else 1)
-    total = sum(random.randint(1, dice_size) for _ in range(total_dice)) + ability_mod + bonus_damage
-    return max(1, total)
+@lru_cache(maxsize=None)
+def compile_damage_roll(dice):
+    """Return ``roll(modifier, crit)`` for a fixed ``(count, size)`` damage expression."""
+    dice_count, dice_size = dice
+    faces = range(1, dice_size + 1)
+    choices = _rng.choices
+
+    def roll(modifier, crit=False):
+        return max(1, sum(choices(faces, k=dice_count * 2 if crit else dice_count)) + modifier)
+
+    return roll
 
 
 def roll_dice(dice):
     if not dice:
         return 0
     count, size = dice
-    return sum(random.randint(1, size) for _ in range(max(0, count)))
+    count = max(0, count)
+    return sum(_rng.randrange(size) for _ in range(count)) + count
 
 # --- DB helpers ---
 
 
 
+# Combat HP changes are persisted write-behind: hot paths queue the latest value
+# per character and a background task flushes them in batches.
+CHARACTER_FLUSH_INTERVAL = 0.5
+_dirty_characters = {}
+_character_flush_task = None
+# Serializes flushes with synchronous HP writes so a flush in flight cannot overwrite a newer value.
+_character_write_lock = threading.Lock()
+
+
 def init_db():
     """Ensure the MariaDB connection is available and seed mobs on startup."""
 
@@ -557,6 +651,31 @@ def create_account(username, password):
     )
 
 
+VERIFIED_LOGIN_CACHE_SIZE = 1024
+# Stored password hash -> keyed digest of the password that last matched it, in LRU
+# order. Only successful logins are remembered; wrong passwords always pay the full
+# PBKDF2 cost.
+_verified_logins = OrderedDict()
+# Random per process so the cached digests cannot be brute-forced offline with a known key.
+_VERIFIED_LOGIN_KEY = os.urandom(32)
+
+
+def verify_account_password(account, password):
+    stored_hash = account["password_hash"]
+    digest = hmac.new(_VERIFIED_LOGIN_KEY, password.encode(), hashlib.sha256).digest()
+    cached = _verified_logins.get(stored_hash)
+    if cached is not None and hmac.compare_digest(cached, digest):
+        _verified_logins.move_to_end(stored_hash)
+        return True
+    if not check_password_hash(stored_hash, password):
+        return False
+    _verified_logins[stored_hash] = digest
+    _verified_logins.move_to_end(stored_hash)
+    if len(_verified_logins) > VERIFIED_LOGIN_CACHE_SIZE:
+        _verified_logins.popitem(last=False)
+    return True
+
+
 def count_account_characters(account_id):
     row = db_utils.fetch_one(
         "SELECT COUNT(*) AS total FROM characters WHERE account_id = :account_id",
@@ -649,11 +768,68 @@ def delete_character(account_id, character_id):
 
 
 def update_character_current_hp(character_id, hp):
-    db_utils.execute(
-        "UPDATE characters SET current_hp = :hp, last_saved_at = CURRENT_TIMESTAMP WHERE character_id = :character_id",
-        hp=int(hp),
-        character_id=character_id,
-    )
+    with _character_write_lock:
+        pending = _dirty_characters.get(character_id)
+        if pending:
+            pending.pop("current_hp", None)
+        db_utils.execute(
+            "UPDATE characters SET current_hp = :hp, last_saved_at = CURRENT_TIMESTAMP WHERE character_id = :character_id",
+            hp=int(hp),
+            character_id=character_id,
+        )
+
+
+def queue_character_current_hp(character_id, hp):
+    """Write-behind variant of update_character_current_hp for combat hot paths."""
+    mark_character_dirty(character_id, {"current_hp": int(hp)})
+
+
+def mark_character_dirty(character_id, fields):
+    global _character_flush_task
+    if character_id is None:
+        return
+    _dirty_characters.setdefault(character_id, {}).update(fields)
+    if _character_flush_task is None:
+        _character_flush_task = socketio.start_background_task(_character_flush_loop)
+
+
+def flush_dirty_characters():
+    """Persist all pending character columns, one executemany per distinct column set."""
+    with _character_write_lock:
+        batches = {}
+        for character_id, fields in _dirty_characters.items():
+            if fields:
+                batches.setdefault(tuple(sorted(fields)), []).append({**fields, "character_id": character_id})
+        for columns, rows in batches.items():
+            assignments = ", ".join(f"{column} = :{column}" for column in columns)
+            db_utils.execute_many(
+                f"UPDATE characters SET {assignments}, last_saved_at = CURRENT_TIMESTAMP WHERE character_id = :character_id",
+                rows,
+            )
+            # Entries stay queued until their batch commits, so readers never see a gap;
+            # only values that were not re-queued during the write are dropped.
+            for row in rows:
+                fields = _dirty_characters.get(row["character_id"])
+                if fields is None:
+                    continue
+                for column in columns:
+                    if column in fields and fields[column] == row[column]:
+                        del fields[column]
+                if not fields:
+                    del _dirty_characters[row["character_id"]]
+
+
+# Persist whatever is still queued when the process exits (including SIGTERM, see __main__).
+atexit.register(flush_dirty_characters)
+
+
+def _character_flush_loop():
+    while True:
+        socketio.sleep(CHARACTER_FLUSH_INTERVAL)
+        try:
+            flush_dirty_characters()
+        except Exception:  # pragma: no cover - database outage; retried next tick
+            continue
 
 
 def update_character_equipped_weapon(character_id, weapon_key):
@@ -738,7 +914,11 @@ def normalize_character_record(record):
 #     "equipped_weapon": str,
 # }
 players = {}
+sid_to_name = {}  # socket sid -> character name, kept in step with players
+room_occupants = {}  # (zone, x, y) -> {character name: None}, in arrival order
+room_state_cache = {}  # sid -> (rev, last room_state payload sent to that socket)
 mobs = {}
+mobs_by_room = {}  # (zone, x, y) -> {mob_id: mob}
 npcs = {}
 npc_lookup_by_id = {}
 npc_conversations = {}
@@ -747,6 +927,41 @@ _openai_client: Optional[object] = None
 _openai_mode: Optional[str] = None
 
 
+def register_player(name, state):
+    existing = players.get(name)
+    if existing:
+        _unindex_occupant(name, get_player_location(existing))
+        if sid_to_name.get(existing.get("sid")) == name:
+            del sid_to_name[existing["sid"]]
+        room_state_cache.pop(existing.get("sid"), None)
+    players[name] = state
+    sid_to_name[state["sid"]] = name
+    _index_occupant(name, get_player_location(state))
+
+
+def remove_player(name):
+    player = players.pop(name, None)
+    if player:
+        _unindex_occupant(name, get_player_location(player))
+        if sid_to_name.get(player.get("sid")) == name:
+            del sid_to_name[player["sid"]]
+        room_state_cache.pop(player.get("sid"), None)
+    return player
+
+
+def _index_occupant(name, loc):
+    room_occupants.setdefault(loc, {})[name] = None
+
+
+def _unindex_occupant(name, loc):
+    occupants = room_occupants.get(loc)
+    if occupants is None:
+        return
+    occupants.pop(name, None)
+    if not occupants:
+        del room_occupants[loc]
+
+
 def compute_action_multiplier(initiative):
     """Convert initiative into a small speed boost/penalty."""
     try:
@@ -781,8 +996,8 @@ def get_player_action_cooldown_remaining(player):
 
 def send_action_denied(username, player, remaining):
     payload = {"reason": "cooldown", "remaining": round(remaining, 2)}
-    socketio.emit("action_denied", payload, to=player["sid"])
-    notify_player(username, f"You must wait {remaining:.1f}s before acting again.")
+    send_event("action_denied", payload, to=player["sid"])
+    _notify_player(player, f"You must wait {remaining:.1f}s before acting again.")
 
 
 def check_player_action_gate(username):
@@ -800,14 +1015,103 @@ def check_player_action_gate(username):
 
 def mark_player_action(player):
     player["last_action_ts"] = time.time()
-room_loot = {}
+# --- Outbound event batching ---
+# Inside batched_emits() every send_event call is buffered and flushed in emission
+# order when the handler finishes. Consecutive events for the same target share one
+# "batch" frame; a change of target starts a new frame, so a client may receive
+# several frames, but always in the order the events were sent.
+EMIT_BATCH_LIMIT = 140
+_emit_batch = ContextVar("emit_batch", default=None)
+
+
+class EmitBatch:
+    def __init__(self):
+        self.runs = []  # [(to, skip_sid), packets] in emission order
+        self.size = 0
+        self.closed = False
+
+    def append(self, event, payload, to, skip_sid=None):
+        if self.closed:
+            socketio.emit(event, payload, to=to, skip_sid=skip_sid)
+            return
+        target = (to, skip_sid)
+        if not self.runs or self.runs[-1][0] != target:
+            self.runs.append((target, []))
+        self.runs[-1][1].append({"event": event, "data": payload})
+        self.size += 1
+        if self.size >= EMIT_BATCH_LIMIT:
+            self.flush()
+
+    def flush(self):
+        runs, self.runs, self.size = self.runs, [], 0
+        for (to, skip_sid), packets in runs:
+            if len(packets) == 1:
+                socketio.emit(packets[0]["event"], packets[0]["data"], to=to, skip_sid=skip_sid)
+            else:
+                socketio.emit("batch", packets, to=to, skip_sid=skip_sid)
+
+
+@contextmanager
+def batched_emits():
+    batch = _emit_batch.get()
+    if batch is not None:
+        yield batch
+        return
+    batch = EmitBatch()
+    token = _emit_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _emit_batch.reset(token)
+        batch.flush()
+        batch.closed = True
+
+
+def flush_emits():
+    batch = _emit_batch.get()
+    if batch is not None:
+        batch.flush()
+
+
+def send_event(event, payload, to=None, room=None, include_self=True, skip_sid=None):
+    to = to or room
+    if not include_self and skip_sid is None:
+        skip_sid = request.sid
+    batch = _emit_batch.get()
+    if batch is None:
+        socketio.emit(event, payload, to=to, skip_sid=skip_sid)
+    else:
+        batch.append(event, payload, to, skip_sid)
+
+
+def join_channel(room, sid=None):
+    # Deliver anything queued under the old membership before it changes.
+    flush_emits()
+    join_room(room, sid=sid)
+
+
+def leave_channel(room, sid=None):
+    flush_emits()
+    leave_room(room, sid=sid)
+
+
+room_loot = {}  # (zone, x, y) -> {lowercased loot id: entry}, in drop order
 _mob_counter = 0
 _loot_counter = 0
 
 
+WORLDS = {}  # zone -> world payload, filled on first lookup
+WORLD_DIMENSIONS = {}  # zone -> (width, height)
+ROOM_GRIDS = {}  # zone -> (width, height, row-major tuple of room payloads or None)
+
+
 def get_world(zone):
+    world = WORLDS.get(zone)
+    if world is not None:
+        return world
     world = db_utils.get_world(zone)
     if world:
+        WORLDS[zone] = world
         return world
     fallback = db_utils.get_world(DEFAULT_ZONE)
     if fallback:
@@ -816,8 +1120,13 @@ def get_world(zone):
 
 
 def get_world_dimensions(zone):
-    world = get_world(zone)
-    return world.get("width", 0), world.get("height", 0)
+    dims = WORLD_DIMENSIONS.get(zone)
+    if dims is None:
+        world = get_world(zone)
+        dims = (world.get("width", 0), world.get("height", 0))
+        if zone in WORLDS:
+            WORLD_DIMENSIONS[zone] = dims
+    return dims
 
 
 def get_world_map(zone):
@@ -909,19 +1218,76 @@ def build_exit_payload(zone, x, y):
     return exits
 
 
+@lru_cache(maxsize=None)
 def room_name(zone, x, y):
     return f"room_{zone}_{x}_{y}"
 
 
+def get_room_grid(zone):
+    grid = ROOM_GRIDS.get(zone)
+    if grid is None:
+        # Unlike get_world, no default-zone fallback: an unknown zone has no rooms.
+        world = db_utils.get_world(zone) or {}
+        width, height = world.get("width", 0), world.get("height", 0)
+        rows = world.get("map", [])
+        rooms = tuple(
+            (rows[y][x] or None) if y < len(rows) and x < len(rows[y]) else None
+            for y in range(height)
+            for x in range(width)
+        )
+        grid = ROOM_GRIDS[zone] = (width, height, rooms)
+    return grid
+
+
 def get_room_info(zone, x, y):
-    payload = db_utils.get_room_payload(zone, x, y)
-    if payload:
-        return payload
+    width, height, rooms = get_room_grid(zone)
+    if 0 <= x < width and 0 <= y < height:
+        payload = rooms[y * width + x]
+        if payload:
+            return payload
     return {"name": "Unknown void", "description": "You should not be here."}
 
 
+def set_player_location(player, zone, x, y):
+    name = player.get("name")
+    registered = name is not None and players.get(name) is player
+    if registered:
+        _unindex_occupant(name, get_player_location(player))
+    player["zone"] = zone
+    player["x"], player["y"] = x, y
+    player["_loc"] = (zone, x, y)
+    if registered:
+        _index_occupant(name, player["_loc"])
+
+
+def get_player_location(player):
+    loc = player.get("_loc")
+    if loc is None:
+        loc = (player.get("zone", DEFAULT_ZONE), player["x"], player["y"])
+        player["_loc"] = loc
+    return loc
+
+
+def get_player_world_ranges(player):
+    """Return ``(range(width), range(height))`` for the player's zone, cached until the zone changes."""
+    zone = get_player_location(player)[0]
+    cached = player.get("_world_ranges")
+    if cached is None or cached[0] != zone:
+        width, height = get_world_dimensions(zone)
+        cached = player["_world_ranges"] = (zone, range(width), range(height))
+    return cached[1], cached[2]
+
+
+def room_has_players(zone, x, y):
+    return (zone, x, y) in room_occupants
+
+
+def count_players_in_room(zone, x, y):
+    return len(room_occupants.get((zone, x, y), ()))
+
+
 def get_players_in_room(zone, x, y):
-    return [u for u, p in players.items() if p.get("zone", DEFAULT_ZONE) == zone and p["x"] == x and p["y"] == y]
+    return list(room_occupants.get((zone, x, y), ()))
 
 
 def random_world_position(zone, exclude=None):
@@ -931,12 +1297,12 @@ def random_world_position(zone, exclude=None):
         return 0, 0
     attempts = 0
     while attempts < 50:
-        x = random.randrange(width)
-        y = random.randrange(height)
+        x = _rng.randrange(width)
+        y = _rng.randrange(height)
         if (x, y) not in exclude:
             return x, y
         attempts += 1
-    return random.randrange(width), random.randrange(height)
+    return _rng.randrange(width), _rng.randrange(height)
 
 
 def roll_hit_points_from_notation(notation, fallback):
@@ -971,12 +1337,13 @@ def roll_hit_points_from_notation(notation, fallback):
         size = int(size_part)
     except ValueError:
         size = max(1, int(fallback or 1))
-    total = sum(random.randint(1, max(1, size)) for _ in range(max(1, count))) + modifier
+    size, count = max(1, size), max(1, count)
+    total = sum(_rng.randrange(size) for _ in range(count)) + count + modifier
     return max(1, total)
 
 
 
-def spawn_mob(template_key, x=None, y=None, zone=None):
+def spawn_mob(template_key, x=None, y=None, zone=None, pending_records=None):
     record = db_utils.get_mob_template(template_key)
     if not record:
         return None
@@ -1045,7 +1412,11 @@ def spawn_mob(template_key, x=None, y=None, zone=None):
             "type": damage_info.get("type", "physical"),
         }
     mobs[mob_id] = mob
-    db_utils.create_mob_instance_record(template_key, room_id, mob.get("hp"))
+    index_mob(mob)
+    if pending_records is None:
+        db_utils.create_mob_instance_record(template_key, room_id, mob.get("hp"))
+    else:
+        pending_records.append({"template_id": template_key, "room_id": room_id, "current_hp": mob.get("hp")})
     return mob
 
 
@@ -1107,6 +1478,9 @@ def spawn_initial_npcs():
             continue
 def spawn_initial_mobs():
     mobs.clear()
+    mobs_by_room.clear()
+    # Every startup spawn is recorded in one batched insert rather than a commit per mob.
+    pending_records = []
     for zone in db_utils.list_zone_ids():
         world = get_world(zone)
         tile_map = world.get("map", [])
@@ -1115,16 +1489,28 @@ def spawn_initial_mobs():
                 if not tile:
                     continue
                 for template_key in tile.get("mobs", []):
-                    spawn_mob(template_key, x, y, zone)
+                    spawn_mob(template_key, x, y, zone, pending_records)
+    db_utils.create_mob_instance_records(pending_records)
     spawn_initial_npcs()
 
 
+def index_mob(mob):
+    key = (mob.get("zone", DEFAULT_ZONE), mob["x"], mob["y"])
+    mobs_by_room.setdefault(key, {})[mob["id"]] = mob
+
+
+def unindex_mob(mob):
+    key = (mob.get("zone", DEFAULT_ZONE), mob["x"], mob["y"])
+    room_mobs = mobs_by_room.get(key)
+    if room_mobs is None:
+        return
+    room_mobs.pop(mob["id"], None)
+    if not room_mobs:
+        del mobs_by_room[key]
+
+
 def get_mobs_in_room(zone, x, y):
-    return [
-        mob
-        for mob in mobs.values()
-        if mob["alive"] and mob.get("zone", DEFAULT_ZONE) == zone and mob["x"] == x and mob["y"] == y
-    ]
+    return [mob for mob in mobs_by_room.get((zone, x, y), {}).values() if mob["alive"]]
 
 
 def get_npcs_in_room(zone, x, y):
@@ -1366,12 +1752,12 @@ def handle_talk_command(username, raw_args):
 
     zone = player.get("zone", DEFAULT_ZONE)
     room = room_name(zone, player["x"], player["y"])
-    socketio.emit(
+    send_event(
         "chat_message",
         {"from": username, "text": f"(to {npc['name']}) {message}"},
         room=room,
     )
-    socketio.emit(
+    send_event(
         "chat_message",
         {"from": npc["name"], "text": reply},
         room=room,
@@ -1381,7 +1767,7 @@ def handle_talk_command(username, raw_args):
     history.append({"speaker": npc.get("name", "The NPC"), "text": reply, "role": "npc"})
     if len(history) > 15:
         npc_conversation_history[npc_key] = history[-15:]
-    send_room_state(username)
+    _send_room_state(player)
     return True, reply
 
 
@@ -1424,33 +1810,29 @@ def mob_combat_loop(mob_id):
         if now - mob.get("last_attack_ts", 0) < interval:
             continue
 
-        username, target = random.choice(engaged)
+        username, target = _rng.choice(engaged)
         damage_info = mob.get("damage", {})
         damage = roll_dice(damage_info.get("dice")) + damage_info.get("bonus", 0)
         damage = max(1, damage)
         mob["last_attack_ts"] = now
 
         target["hp"] = clamp_hp(target["hp"] - damage, target["max_hp"])
-        update_character_current_hp(target["character_id"], target["hp"])
+        queue_character_current_hp(target["character_id"], target["hp"])
         room = room_name(mob.get("zone", DEFAULT_ZONE), mob["x"], mob["y"])
         dmg_type = damage_info.get("type")
         suffix = f" {dmg_type} damage" if dmg_type else " damage"
-        socketio.emit(
-            "system_message",
-            {"text": f"{mob['name']} strikes {username} for {damage}{suffix}!"},
-            room=room,
-        )
-        send_room_state(username)
-        broadcast_room_state(mob.get("zone", DEFAULT_ZONE), mob["x"], mob["y"])
-
+        messages = [f"{mob['name']} strikes {username} for {damage}{suffix}!"]
         if target["hp"] == 0:
-            socketio.emit(
-                "system_message",
-                {"text": f"{username} is felled by {mob['name']}!"},
-                room=room,
-            )
-            targets.discard(username)
-            respawn_player(username)
+            messages.append(f"{username} is felled by {mob['name']}!")
+        # One frame per client for the hit text and the HP patch that follows it.
+        with batched_emits():
+            emit_messages(room, messages)
+            # The target is standing in the mob's room, so the broadcast refreshes them too.
+            broadcast_room_state(mob.get("zone", DEFAULT_ZONE), mob["x"], mob["y"])
+
+            if target["hp"] == 0:
+                targets.discard(username)
+                respawn_player(username)
 
     mob = mobs.get(mob_id)
     if mob:
@@ -1475,13 +1857,13 @@ def engage_mob_with_player(mob, username, auto=False):
         targets.add(username)
         room = room_name(mob.get("zone", DEFAULT_ZONE), mob["x"], mob["y"])
         if auto:
-            socketio.emit(
+            send_event(
                 "system_message",
                 {"text": f"{mob['name']} lunges at {username}!"},
                 room=room,
             )
         else:
-            socketio.emit(
+            send_event(
                 "system_message",
                 {"text": f"{mob['name']} turns to fight {username}!"},
                 room=room,
@@ -1511,17 +1893,20 @@ def trigger_aggressive_mobs_for_player(username, x, y):
     """Aggressive mobs attack as soon as a fresh player enters their room."""
     player = players.get(username)
     zone = player.get("zone", DEFAULT_ZONE) if player else DEFAULT_ZONE
-    for mob in get_mobs_in_room(zone, x, y):
-        if mob.get("behaviour_type") == "aggressive" and mob.get("alive"):
+    room_mobs = mobs_by_room.get((zone, x, y))
+    if not room_mobs:
+        return
+    for mob in tuple(room_mobs.values()):
+        if mob["alive"] and mob.get("behaviour_type") == "aggressive":
             engage_mob_with_player(mob, username, auto=True)
 
 
 def get_loot_in_room(zone, x, y):
-    return list(room_loot.get((zone, x, y), []))
+    return list(room_loot.get((zone, x, y), {}).values())
 
 
 def add_loot_to_room(zone, x, y, loot_entry):
-    room_loot.setdefault((zone, x, y), []).append(loot_entry)
+    room_loot.setdefault((zone, x, y), {})[loot_entry["id"].lower()] = loot_entry
 
 
 def generate_loot_entry_gold(amount):
@@ -1591,9 +1976,18 @@ def get_spell_cooldown_remaining(player, spell_key):
     return int(math.ceil(remaining))
 
 
+def mark_player_stats_dirty(player):
+    if player:
+        player["_stats_dirty"] = True
+
+
 def recalculate_player_stats(player):
+    """Refresh derived combat stats; skipped while inputs are unchanged and no effect has expired."""
     if not player:
         return
+    now = time.time()
+    if not player.get("_stats_dirty", True) and now < player.get("_stats_valid_until", 0):
+        return
     base_mods = dict(player.get("base_ability_mods") or player.get("ability_mods") or {})
     if "base_ability_mods" not in player:
         player["base_ability_mods"] = dict(base_mods)
@@ -1607,12 +2001,14 @@ def recalculate_player_stats(player):
     ac_bonus = 0
     attack_roll_bonus = []
     damage_bonus = 0
-    now = time.time()
+    valid_until = math.inf
     active_effects = []
     for effect in player.get("active_effects", []) or []:
         expires_at = effect.get("expires_at")
         if expires_at and expires_at <= now:
             continue
+        if expires_at:
+            valid_until = min(valid_until, expires_at)
         active_effects.append(effect)
         modifiers = effect.get("modifiers") or {}
         for ability, delta in (modifiers.get("ability_mods") or {}).items():
@@ -1630,10 +2026,15 @@ def recalculate_player_stats(player):
     attack_mod = ability_mods.get(attack_ability, 0) if attack_ability else 0
     player["attack_bonus"] = proficiency + attack_mod + extra_attack_bonus
     player["attack_roll_bonus_dice"] = attack_roll_bonus
+    player["_attack_bonus_cache"] = [
+        (bonus.get("label") or format_dice(bonus.get("dice")), bonus.get("dice")) for bonus in attack_roll_bonus
+    ]
     player["damage_bonus"] = damage_bonus
     player.setdefault("cooldowns", {})
     player.setdefault("active_effects", [])
     update_player_action_timing(player)
+    player["_stats_dirty"] = False
+    player["_stats_valid_until"] = valid_until
 
 
 def apply_effect_to_player(target, effect_template):
@@ -1660,6 +2061,7 @@ def apply_effect_to_player(target, effect_template):
                 break
     if not replaced:
         effects.append(effect)
+    mark_player_stats_dirty(target)
     recalculate_player_stats(target)
     return effect
 
@@ -1715,6 +2117,7 @@ def build_player_state(user_record, sid):
         "zone": DEFAULT_ZONE,
         "x": start_x,
         "y": start_y,
+        "_loc": (DEFAULT_ZONE, start_x, start_y),
         "character_id": user_record.get("id"),
         "account_id": user_record.get("account_id"),
         "name": user_record.get("name"),
@@ -1726,7 +2129,8 @@ def build_player_state(user_record, sid):
     state["items"] = list(state.get("items", []))
     state["gold"] = int(derived.get("gold", 0))
     state["xp"] = int(derived.get("xp", 0))
-    state["hp"] = clamp_hp(user_record.get("current_hp"), derived["max_hp"])
+    current_hp = user_record.get("current_hp")
+    state["hp"] = clamp_hp(None if current_hp is None else int(current_hp), derived["max_hp"])
     state["base_ability_mods"] = dict(state.get("ability_mods", {}))
     state["base_ac"] = state.get("ac", 10)
     state["base_initiative"] = 10
@@ -1736,9 +2140,11 @@ def build_player_state(user_record, sid):
     state["active_effects"] = []
     state["cooldowns"] = {}
     state["spells"] = get_spells_for_class(state.get("char_class"))
+    index_player_spells(state)
     state["attack_roll_bonus_dice"] = []
     state["damage_bonus"] = 0
-    state["searched_rooms"] = set()
+    state["_stats_dirty"] = True
+    state["searched_rooms"] = {}
     apply_weapon_to_player_state(state, state.get("equipped_weapon"))
     recalculate_player_stats(state)
     return state
@@ -1750,23 +2156,26 @@ def apply_weapon_to_player_state(player, weapon_key=None):
     player["equipped_weapon"] = weapon_key
     weapon_payload = format_weapon_payload(weapon_key)
     player["weapon"] = weapon_payload
-    class_name = normalize_choice(player.get("char_class"), CLASSES, DEFAULT_CLASS)
+    player["_damage_roll"] = compile_damage_roll(tuple(weapon_payload["dice"]))
+    class_name = normalize_choice(player.get("char_class"), CLASS_LOOKUP, DEFAULT_CLASS)
     class_data = CLASSES[class_name]
     attack_ability = weapon_payload.get("ability") or class_data["primary_ability"]
     player["attack_ability"] = attack_ability
+    mark_player_stats_dirty(player)
     recalculate_player_stats(player)
     return weapon_payload
 
 
 def resolve_weapon_key_from_input(player, identifier):
+    """Return ``(key, name)`` for the inventory weapon matching the input, or ``(None, None)``."""
     if not identifier:
-        return None
+        return None, None
     target = identifier.strip().lower()
     for key in player.get("inventory", []):
-        weapon = get_weapon(key)
-        if key.lower() == target or weapon["name"].lower() == target:
-            return key
-    return None
+        name = get_weapon(key)["name"]
+        if key.lower() == target or name.lower() == target:
+            return key, name
+    return None, None
 
 
 def equip_weapon_for_player(username, weapon_identifier):
@@ -1776,56 +2185,26 @@ def equip_weapon_for_player(username, weapon_identifier):
     if not weapon_identifier:
         return False, "Select a weapon to equip."
 
-    weapon_key = resolve_weapon_key_from_input(player, weapon_identifier)
+    weapon_key, weapon_name = resolve_weapon_key_from_input(player, weapon_identifier)
     if not weapon_key:
         return False, "You do not possess that weapon."
     if weapon_key == player.get("equipped_weapon"):
-        return False, f"{get_weapon(weapon_key)['name']} is already equipped."
+        return False, f"{weapon_name} is already equipped."
 
     apply_weapon_to_player_state(player, weapon_key)
     update_character_equipped_weapon(player["character_id"], weapon_key)
-    send_room_state(username)
+    _send_room_state(player)
 
-    zone = player.get("zone", DEFAULT_ZONE)
-    room = room_name(zone, player["x"], player["y"])
-    message = f"{username} equips {player['weapon']['name']}."
-    socketio.emit("system_message", {"text": message}, room=room)
+    room = room_name(*get_player_location(player))
+    message = f"{username} equips {weapon_name}."
+    send_event("system_message", {"text": message}, room=room)
     return True, message
 
 
-def send_room_state(username):
-    player = players.get(username)
-    if not player:
-        return
-    recalculate_player_stats(player)
-    x, y = player["x"], player["y"]
-    zone = player.get("zone", DEFAULT_ZONE)
+@lru_cache(maxsize=4096)
+def build_room_scenery(zone, x, y, door_hash):
+    """Room fields that only change with door state; ``door_hash`` keys the cache on it."""
     room = get_room_info(zone, x, y)
-    occupants = get_players_in_room(zone, x, y)
-    weapon = player.get("weapon", {})
-    inventory_payload = []
-    for key in player.get("inventory", []):
-        info = format_weapon_payload(key)
-        inventory_payload.append(
-            {
-                "key": info["key"],
-                "name": info["name"],
-                "dice": info["dice_label"],
-                "damage_type": info["damage_type"],
-                "equipped": info["key"] == player.get("equipped_weapon"),
-            }
-        )
-    item_payload = []
-    for key in player.get("items", []):
-        info = format_item_payload(key)
-        if not info:
-            continue
-        item_payload.append(info)
-    mobs_here = [format_mob_payload(mob) for mob in get_mobs_in_room(zone, x, y)]
-    npcs_here = [format_npc_payload(npc, viewer=username) for npc in get_npcs_in_room(zone, x, y)]
-    loot_here = format_loot_payload(get_loot_in_room(zone, x, y))
-    doors_here = get_room_door_payload(zone, x, y)
-    exits = build_exit_payload(zone, x, y)
     warp_info = None
     if room.get("travel_to"):
         warp_info = {
@@ -1833,106 +2212,230 @@ def send_room_state(username):
             "description": room.get("warp_description")
             or "A rune-carved warp stone hums softly, awaiting activation.",
         }
-    payload = {
+    return {
         "zone": zone,
         "world_name": get_world(zone)["name"],
         "x": x,
         "y": y,
         "room_name": room["name"],
         "description": room["description"],
-        "players": occupants,
-        "mobs": mobs_here,
-        "npcs": npcs_here,
-        "loot": loot_here,
-        "doors": doors_here,
-        "exits": exits,
+        "doors": get_room_door_payload(zone, x, y),
+        "exits": build_exit_payload(zone, x, y),
         "warp_stone": warp_info,
-        "character": {
-            "id": player.get("character_id"),
-            "name": player.get("name"),
-            "bio": player.get("bio", ""),
-            "description": player.get("description", ""),
-            "race": player["race"],
-            "char_class": player["char_class"],
-            "level": player.get("level", 1),
-            "hp": player["hp"],
-            "max_hp": player["max_hp"],
-            "ac": player["ac"],
-            "proficiency": player["proficiency"],
-            "weapon": {
-                "key": weapon.get("key", DEFAULT_WEAPON_KEY),
-                "name": weapon.get("name", "Unarmed"),
-                "dice": weapon.get("dice_label", "-"),
-                "damage_type": weapon.get("damage_type", ""),
-            },
-            "attack_bonus": player["attack_bonus"],
-            "attack_ability": player["attack_ability"],
-            "abilities": player["abilities"],
-            "ability_mods": player["ability_mods"],
-            "weapon_inventory": inventory_payload,
-            "items": item_payload,
-            "gold": player.get("gold", 0),
-            "xp": player.get("xp", 0),
-            "spells": format_spell_list(player),
-            "effects": format_effect_list(player),
+    }
+
+
+def build_room_block(zone, x, y):
+    """Build the part of ``room_state`` that is identical for every occupant of a room."""
+    block = dict(build_room_scenery(zone, x, y, door_state_hash))
+    block["players"] = get_players_in_room(zone, x, y)
+    block["mobs"] = [format_mob_payload(mob) for mob in get_mobs_in_room(zone, x, y)]
+    block["loot"] = format_loot_payload(get_loot_in_room(zone, x, y))
+    return block
+
+
+@lru_cache(maxsize=256)
+def format_inventory_payload(inventory, equipped_weapon):
+    payload = []
+    for key in inventory:
+        info = format_weapon_payload(key)
+        payload.append(
+            {
+                "key": info["key"],
+                "name": info["name"],
+                "dice": info["dice_label"],
+                "damage_type": info["damage_type"],
+                "equipped": info["key"] == equipped_weapon,
+            }
+        )
+    return payload
+
+
+@lru_cache(maxsize=256)
+def format_items_payload(items):
+    return [info for info in map(format_item_payload, items) if info]
+
+
+def build_character_block(player):
+    weapon = player.get("weapon", {})
+    # Inventories rarely change between room states, so their payloads are cached by content.
+    inventory_payload = format_inventory_payload(
+        tuple(player.get("inventory", [])), player.get("equipped_weapon")
+    )
+    item_payload = format_items_payload(tuple(player.get("items", [])))
+    return {
+        "id": player.get("character_id"),
+        "name": player.get("name"),
+        "bio": player.get("bio", ""),
+        "description": player.get("description", ""),
+        "race": player["race"],
+        "char_class": player["char_class"],
+        "level": player.get("level", 1),
+        "hp": player["hp"],
+        "max_hp": player["max_hp"],
+        "ac": player["ac"],
+        "proficiency": player["proficiency"],
+        "weapon": {
+            "key": weapon.get("key", DEFAULT_WEAPON_KEY),
+            "name": weapon.get("name", "Unarmed"),
+            "dice": weapon.get("dice_label", "-"),
+            "damage_type": weapon.get("damage_type", ""),
         },
+        "attack_bonus": player["attack_bonus"],
+        "attack_ability": player["attack_ability"],
+        "abilities": player["abilities"],
+        "ability_mods": player["ability_mods"],
+        "weapon_inventory": inventory_payload,
+        "items": item_payload,
+        "gold": player.get("gold", 0),
+        "xp": player.get("xp", 0),
+        "spells": format_spell_list(player),
+        "effects": format_effect_list(player),
     }
-    socketio.emit("room_state", payload, to=player["sid"])
+
+
+def send_room_state(username, room_block=None):
+    _send_room_state(players.get(username), room_block)
+
+
+def _send_room_state(player, room_block=None):
+    if not player:
+        return
+    recalculate_player_stats(player)
+    zone, x, y = get_player_location(player)
+    if room_block is None:
+        room_block = build_room_block(zone, x, y)
+    payload = dict(room_block)
+    payload["npcs"] = [format_npc_payload(npc, viewer=player["name"]) for npc in get_npcs_in_room(zone, x, y)]
+    payload["character"] = build_character_block(player)
+    emit_room_state(player["sid"], payload)
+
+
+def emit_room_state(sid, payload):
+    """Send ``room_state``, or a ``room_state_patch`` of changed top-level keys when that is smaller."""
+    previous = room_state_cache.get(sid)
+    if previous:
+        base_rev, base_payload = previous
+        changes = {key: value for key, value in payload.items() if base_payload.get(key) != value}
+        if not changes:
+            return
+        rev = base_rev + 1
+        room_state_cache[sid] = (rev, payload)
+        if len(changes) < len(payload) / 2:
+            send_event("room_state_patch", {"rev": rev, "base": base_rev, "changes": changes}, to=sid)
+            return
+    else:
+        rev = 1
+        room_state_cache[sid] = (rev, payload)
+    send_event("room_state", dict(payload, rev=rev), to=sid)
+
+
+def send_room_states(*targets):
+    """Refresh several players at once, building each room block only once."""
+    room_blocks = {}
+    for player in targets:
+        if not player:
+            continue
+        location = get_player_location(player)
+        room_block = room_blocks.get(location)
+        if room_block is None:
+            room_block = room_blocks[location] = build_room_block(*location)
+        _send_room_state(player, room_block)
 
 
 def broadcast_room_state(zone, x, y):
-    for occupant in get_players_in_room(zone, x, y):
-        send_room_state(occupant)
+    # Area of interest: rooms nobody is standing in get no serialization at all.
+    if not room_has_players(zone, x, y):
+        return
+    occupants = get_players_in_room(zone, x, y)
+    room_block = build_room_block(zone, x, y)
+    for occupant in occupants:
+        send_room_state(occupant, room_block=room_block)
 
 
 def describe_adjacent_players(player):
-    directions = [
-        ("north", (0, -1)),
-        ("south", (0, 1)),
-        ("west", (-1, 0)),
-        ("east", (1, 0)),
-    ]
     lines = []
-    zone = player.get("zone", DEFAULT_ZONE)
+    zone, x, y = get_player_location(player)
     width, height = get_world_dimensions(zone)
-    for label, (dx, dy) in directions:
-        nx, ny = player["x"] + dx, player["y"] + dy
+    for label, (dx, dy) in ADJACENT_DIRECTIONS:
+        nx, ny = x + dx, y + dy
         if not (0 <= nx < width and 0 <= ny < height):
             continue
         occupants = get_players_in_room(zone, nx, ny)
         room = get_room_info(zone, nx, ny)
         if occupants:
-            lines.append(f"{label.title()} ({room['name']}): {', '.join(occupants)}")
+            lines.append(f"{label} ({room['name']}): {', '.join(occupants)}")
         else:
-            lines.append(f"{label.title()} ({room['name']}): No one in sight.")
+            lines.append(f"{label} ({room['name']}): No one in sight.")
     if not lines:
         return "You sense nothing nearby."
     return "Nearby presences:\n" + "\n".join(lines)
 
 
-def extract_spell_and_target(player, text):
-    cleaned = (text or "").strip()
-    if not cleaned:
-        return None, None
-    lower = cleaned.lower()
+def index_player_spells(player):
+    """Rebuild the lowercase token lookup used to parse /cast input; call whenever spells change."""
+    index = {}
+    multiword = []
     for key in player.get("spells", []):
         spell = get_spell(key)
         if not spell:
             continue
-        for candidate in (key.lower(), spell["name"].lower()):
-            if lower.startswith(candidate):
-                remainder = cleaned[len(candidate) :].strip()
-                return key, (remainder or None)
-    parts = cleaned.split(None, 1)
-    if not parts:
+        for token in (key.lower(), spell["name"].lower()):
+            if len(token.split()) > 1:
+                multiword.append((token, key))
+            else:
+                index.setdefault(token, key)
+    player["_spell_prefix_index"] = index
+    player["_spell_prefix_multiword"] = sorted(multiword, key=lambda item: len(item[0]), reverse=True)
+
+
+def extract_spell_and_target(player, text):
+    cleaned = (text or "").strip()
+    if not cleaned:
         return None, None
-    key_guess = resolve_spell_key_from_input(player, parts[0])
-    if key_guess:
+    if "_spell_prefix_index" not in player:
+        index_player_spells(player)
+    parts = cleaned.split(None, 1)
+    key = player["_spell_prefix_index"].get(parts[0].lower())
+    if key:
         remainder = parts[1].strip() if len(parts) > 1 else None
-        return key_guess, (remainder or None)
+        return key, (remainder or None)
+    lower = cleaned.lower()
+    for token, key in player["_spell_prefix_multiword"]:
+        if lower.startswith(token) and (len(lower) == len(token) or lower[len(token)].isspace()):
+            remainder = cleaned[len(token) :].strip()
+            return key, (remainder or None)
+    return None, None
+
+
+def _resolve_target_none(username, identifier, spell):
     return None, None
 
 
+def _resolve_target_self(username, identifier, spell):
+    return username, None
+
+
+def _resolve_target_enemy(username, identifier, spell):
+    if not identifier:
+        return None, f"Choose a target for {spell['name']}."
+    return identifier, None
+
+
+def _resolve_target_default(username, identifier, spell):
+    return identifier or username, None
+
+
+TARGET_REQUIREMENT_RESOLVERS = {
+    "none": _resolve_target_none,
+    "self": _resolve_target_self,
+    "ally": _resolve_target_default,
+    "self_or_ally": _resolve_target_default,
+    "ally_or_self": _resolve_target_default,
+    "enemy": _resolve_target_enemy,
+}
+
+
 def cast_spell_for_player(username, spell_identifier, target_identifier=None):
     player = players.get(username)
     if not player:
@@ -1961,19 +2464,10 @@ def cast_spell_for_player(username, spell_identifier, target_identifier=None):
 
     target_requirement = spell.get("target", "self")
     identifier = (target_identifier or "").strip()
-    target_name = None
-    if target_requirement == "none":
-        target_name = None
-    elif target_requirement == "self":
-        target_name = username
-    elif target_requirement in ("ally", "self_or_ally", "ally_or_self"):
-        target_name = identifier or username
-    elif target_requirement == "enemy":
-        if not identifier:
-            return False, f"Choose a target for {spell['name']}."
-        target_name = identifier
-    else:
-        target_name = identifier or username
+    resolver = TARGET_REQUIREMENT_RESOLVERS.get(target_requirement, _resolve_target_default)
+    target_name, error = resolver(username, identifier, spell)
+    if error:
+        return False, error
 
     target_player = None
     if target_name:
@@ -1986,9 +2480,7 @@ def cast_spell_for_player(username, spell_identifier, target_identifier=None):
         if target_requirement == "enemy" and target_name == username:
             return False, "You cannot target yourself with that."
         if target_requirement != "none":
-            if player.get("zone", DEFAULT_ZONE) != target_player.get("zone", DEFAULT_ZONE):
-                return False, f"{target_name} is not in the same room."
-            if (player["x"], player["y"]) != (target_player["x"], target_player["y"]):
+            if get_player_location(player) != get_player_location(target_player):
                 return False, f"{target_name} is not in the same room."
         recalculate_player_stats(target_player)
 
@@ -2001,16 +2493,16 @@ def cast_spell_for_player(username, spell_identifier, target_identifier=None):
     if cooldown:
         player.setdefault("cooldowns", {})[spell_key] = time.time() + cooldown
 
-    send_room_state(username)
     if target_player and target_name and target_name != username:
-        send_room_state(target_name)
+        send_room_states(player, target_player)
+    else:
+        _send_room_state(player)
 
     return True, feedback
 
 
 def execute_spell(caster_name, caster, spell_key, spell, target_player, target_name):
-    zone = caster.get("zone", DEFAULT_ZONE)
-    room = room_name(zone, caster["x"], caster["y"])
+    room = room_name(*get_player_location(caster))
     ability_mod = caster.get("ability_mods", {}).get(spell.get("ability"), 0)
     spell_type = spell.get("type")
 
@@ -2018,23 +2510,24 @@ def execute_spell(caster_name, caster, spell_key, spell, target_player, target_n
         if not target_player or not target_name:
             return False, "No valid target."
         damage_info = spell.get("damage", {})
-        damage = roll_dice(damage_info.get("dice")) + damage_info.get("bonus", 0)
-        if damage_info.get("add_ability_mod"):
+        dice = damage_info.get("dice")
+        bonus = damage_info.get("bonus", 0)
+        add_ability_mod = damage_info.get("add_ability_mod")
+        damage_type = damage_info.get("damage_type")
+        damage = roll_dice(dice) + bonus
+        if add_ability_mod:
             damage += ability_mod
         damage += caster.get("damage_bonus", 0)
         damage = max(1, damage)
         target_player["hp"] = clamp_hp(target_player["hp"] - damage, target_player["max_hp"])
-        update_character_current_hp(target_player["character_id"], target_player["hp"])
-        damage_type = damage_info.get("damage_type")
+        queue_character_current_hp(target_player["character_id"], target_player["hp"])
         dmg_suffix = f" {damage_type} damage" if damage_type else " damage"
         message = f"{caster_name} casts {spell['name']} at {target_name}, dealing {damage}{dmg_suffix}!"
-        socketio.emit("system_message", {"text": message}, room=room)
+        messages = [message]
+        if target_player["hp"] == 0:
+            messages.append(f"{target_name} collapses under the assault!")
+        emit_messages(room, messages)
         if target_player["hp"] == 0:
-            socketio.emit(
-                "system_message",
-                {"text": f"{target_name} collapses under the assault!"},
-                room=room,
-            )
             respawn_player(target_name)
         return True, message
 
@@ -2042,24 +2535,27 @@ def execute_spell(caster_name, caster, spell_key, spell, target_player, target_n
         target = target_player or caster
         target_label = target_name or caster_name
         heal_info = spell.get("heal", {})
-        amount = 0
-        if heal_info.get("dice"):
-            amount += roll_dice(heal_info.get("dice"))
-        if heal_info.get("add_ability_mod"):
+        dice = heal_info.get("dice")
+        bonus = heal_info.get("bonus", 0)
+        add_ability_mod = heal_info.get("add_ability_mod")
+        add_level = heal_info.get("add_level")
+        amount = bonus
+        if dice:
+            amount += roll_dice(dice)
+        if add_ability_mod:
             amount += ability_mod
-        if heal_info.get("add_level"):
+        if add_level:
             amount += caster.get("level", 1)
-        amount += heal_info.get("bonus", 0)
         amount = max(1, amount)
         before = target["hp"]
         target["hp"] = clamp_hp(target["hp"] + amount, target["max_hp"])
         restored = target["hp"] - before
-        update_character_current_hp(target["character_id"], target["hp"])
+        queue_character_current_hp(target["character_id"], target["hp"])
         if restored <= 0:
             message = f"{spell['name']} has no effect on {target_label}."
         else:
             message = f"{caster_name} casts {spell['name']} and restores {restored} HP to {target_label}."
-        socketio.emit("system_message", {"text": message}, room=room)
+        send_event("system_message", {"text": message}, room=room)
         return True, message
 
     if spell_type == "buff":
@@ -2077,12 +2573,12 @@ def execute_spell(caster_name, caster, spell_key, spell, target_player, target_n
             message = f"{caster_name} casts {spell['name']} on {target_label}."
         if description:
             message += f" ({description})"
-        socketio.emit("system_message", {"text": message}, room=room)
+        send_event("system_message", {"text": message}, room=room)
         return True, message
 
     if spell_type == "utility":
         if spell_key == "keen_eye":
-            socketio.emit(
+            send_event(
                 "system_message",
                 {"text": f"{caster_name} narrows their eyes, surveying the surrounding paths."},
                 room=room,
@@ -2091,19 +2587,33 @@ def execute_spell(caster_name, caster, spell_key, spell, target_player, target_n
             notify_player(caster_name, report)
             return True, report
         message = f"{caster_name} invokes {spell['name']}, but its effect is subtle."
-        socketio.emit("system_message", {"text": message}, room=room)
+        send_event("system_message", {"text": message}, room=room)
         return True, message
 
     message = f"{caster_name} channels {spell['name']}, but nothing notable happens."
-    socketio.emit("system_message", {"text": message}, room=room)
+    send_event("system_message", {"text": message}, room=room)
     return True, message
 
 
+def emit_messages(room, texts):
+    """Send several system messages to a room as a single frame."""
+    texts = [text for text in texts if text]
+    if not texts:
+        return
+    if len(texts) == 1:
+        send_event("system_message", {"text": texts[0]}, room=room)
+        return
+    send_event("system_messages", {"texts": texts}, room=room)
+
+
 def notify_player(username, text):
-    player = players.get(username)
+    _notify_player(players.get(username), text)
+
+
+def _notify_player(player, text):
     if not player:
         return
-    socketio.emit("system_message", {"text": text}, to=player["sid"])
+    send_event("system_message", {"text": text}, to=player["sid"])
 
 
 def respawn_player(username):
@@ -2114,156 +2624,185 @@ def respawn_player(username):
     zone = player.get("zone", DEFAULT_ZONE)
     old_room = room_name(zone, player["x"], player["y"])
     disengage_player_from_room_mobs(username, player["x"], player["y"])
-    leave_room(old_room, sid=player["sid"])
-    socketio.emit(
+    leave_channel(old_room, sid=player["sid"])
+    send_event(
         "system_message",
         {"text": f"{username} collapses and vanishes in a swirl of grey mist."},
         room=old_room,
     )
 
-    player["zone"] = DEFAULT_ZONE
     start_x, start_y = get_world_start(DEFAULT_ZONE)
-    player["x"], player["y"] = start_x, start_y
+    set_player_location(player, DEFAULT_ZONE, start_x, start_y)
     player["hp"] = player["max_hp"]
-    update_character_current_hp(player["character_id"], player["hp"])
+    queue_character_current_hp(player["character_id"], player["hp"])
     player["active_effects"] = []
+    mark_player_stats_dirty(player)
     recalculate_player_stats(player)
 
     new_room = room_name(player["zone"], player["x"], player["y"])
-    join_room(new_room, sid=player["sid"])
-    socketio.emit(
+    join_channel(new_room, sid=player["sid"])
+    send_event(
         "system_message",
         {"text": f"{username} staggers back into the area, looking dazed."},
         room=new_room,
-        include_self=False,
+        skip_sid=player["sid"],
     )
-    notify_player(username, "You have been defeated and return to the village square.")
-    send_room_state(username)
+    _notify_player(player, "You have been defeated and return to the village square.")
+    _send_room_state(player)
     trigger_aggressive_mobs_for_player(username, player["x"], player["y"])
 
 
+COMMANDS = {}
+
+
+def register_command(*names):
+    """Register a slash-command handler under one or more lowercase names."""
+
+    def decorator(func):
+        for name in names:
+            COMMANDS[name] = func
+        return func
+
+    return decorator
+
+
+@register_command("attack", "fight")
+def _command_attack(username, args):
+    parts = args.split()
+    if not parts:
+        notify_player(username, "Usage: /attack <target>")
+        return
+    resolve_attack(username, parts[0])
+
+
+@register_command("equip", "wield")
+def _command_equip(username, args):
+    weapon_name = " ".join(args.split())
+    if not weapon_name:
+        notify_player(username, "Usage: /equip <weapon_name>")
+        return
+    success, message = equip_weapon_for_player(username, weapon_name)
+    if not success:
+        notify_player(username, message)
+
+
+@register_command("search", "investigate")
+def _command_search(username, args):
+    success, message = perform_search_action(username)
+    if not success and message:
+        notify_player(username, message)
+
+
+@register_command("cast")
+def _command_cast(username, args):
+    player = players.get(username)
+    if not player:
+        notify_player(username, "You are not in the game.")
+        return
+    if not args:
+        notify_player(username, "Usage: /cast <spell_name> [target]")
+        return
+    spell_key, target_text = extract_spell_and_target(player, args)
+    if not spell_key:
+        _notify_player(player, "You do not know that spell or ability.")
+        return
+    success, message = cast_spell_for_player(username, spell_key, target_text)
+    if not success and message:
+        _notify_player(player, message)
+
+
+@register_command("spells", "abilities")
+def _command_spells(username, args):
+    player = players.get(username)
+    if not player:
+        notify_player(username, "You are not in the game.")
+        return
+    recalculate_player_stats(player)
+    known = format_spell_list(player)
+    if not known:
+        _notify_player(player, "You have no spells or class abilities.")
+        return
+    lines = []
+    for spell in known:
+        cooldown = spell.get("cooldown_remaining", 0)
+        base_cd = spell.get("cooldown", 0)
+        if cooldown:
+            cooldown_text = f" (recharges in {cooldown}s)"
+        elif base_cd:
+            cooldown_text = f" ({base_cd}s cooldown)"
+        else:
+            cooldown_text = ""
+        spell_type = spell.get("type") or ""
+        type_label = f"[{spell_type}] " if spell_type else ""
+        lines.append(f"- {type_label}{spell['name']}: {spell['description']}{cooldown_text}")
+    _notify_player(player, "Known spells & abilities:\n" + "\n".join(lines))
+
+
+@register_command("loot", "take", "pickup")
+def _command_loot(username, args):
+    parts = args.split()
+    if not parts:
+        notify_player(username, "Usage: /loot <loot-id>")
+        return
+    success, message = pickup_loot(username, parts[0])
+    if not success and message:
+        notify_player(username, message)
+
+
+@register_command("talk")
+def _command_talk(username, args):
+    success, message = handle_talk_command(username, args)
+    if not success and message:
+        notify_player(username, message)
+
+
 def handle_command(username, command_text):
     command_text = (command_text or "").strip()
     if not command_text:
         return False
 
-    parts = command_text.split()
+    parts = command_text.split(None, 1)
     cmd = parts[0].lower()
-    if cmd in ("attack", "fight"):
-        if len(parts) < 2:
-            notify_player(username, "Usage: /attack <target>")
-            return True
-        target_name = parts[1]
-        resolve_attack(username, target_name)
-        return True
-    if cmd in ("equip", "wield"):
-        if len(parts) < 2:
-            notify_player(username, "Usage: /equip <weapon_name>")
-            return True
-        weapon_name = " ".join(parts[1:])
-        success, message = equip_weapon_for_player(username, weapon_name)
-        if not success:
-            notify_player(username, message)
-        return True
-    if cmd in ("search", "investigate"):
-        success, message = perform_search_action(username)
-        if not success and message:
-            notify_player(username, message)
-        return True
-    if cmd == "cast":
-        player = players.get(username)
-        if not player:
-            notify_player(username, "You are not in the game.")
-            return True
-        remainder = command_text[len(parts[0]):].strip()
-        if not remainder:
-            notify_player(username, "Usage: /cast <spell_name> [target]")
-            return True
-        spell_key, target_text = extract_spell_and_target(player, remainder)
-        if not spell_key:
-            notify_player(username, "You do not know that spell or ability.")
-            return True
-        success, message = cast_spell_for_player(username, spell_key, target_text)
-        if not success and message:
-            notify_player(username, message)
-        return True
-    if cmd in ("spells", "abilities"):
-        player = players.get(username)
-        if not player:
-            notify_player(username, "You are not in the game.")
-            return True
-        recalculate_player_stats(player)
-        known = format_spell_list(player)
-        if not known:
-            notify_player(username, "You have no spells or class abilities.")
-            return True
-        lines = []
-        for spell in known:
-            cooldown = spell.get("cooldown_remaining", 0)
-            base_cd = spell.get("cooldown", 0)
-            if cooldown:
-                cooldown_text = f" (recharges in {cooldown}s)"
-            elif base_cd:
-                cooldown_text = f" ({base_cd}s cooldown)"
-            else:
-                cooldown_text = ""
-            spell_type = spell.get("type") or ""
-            type_label = f"[{spell_type}] " if spell_type else ""
-            lines.append(f"- {type_label}{spell['name']}: {spell['description']}{cooldown_text}")
-        notify_player(username, "Known spells & abilities:\n" + "\n".join(lines))
-        return True
-    if cmd in ("loot", "take", "pickup"):
-        if len(parts) < 2:
-            notify_player(username, "Usage: /loot <loot-id>")
-            return True
-        loot_id = parts[1]
-        success, message = pickup_loot(username, loot_id)
-        if not success and message:
-            notify_player(username, message)
-        return True
-    if cmd == "talk":
-        remainder = command_text[len(parts[0]) :].strip()
-        success, message = handle_talk_command(username, remainder)
-        if not success and message:
-            notify_player(username, message)
+    args = parts[1].strip() if len(parts) > 1 else ""
+    handler = COMMANDS.get(cmd)
+    if handler is None:
+        notify_player(username, f"Unknown command: {cmd}")
         return True
-
-    notify_player(username, f"Unknown command: {cmd}")
+    handler(username, args)
     return True
 
-def attack_roll_success(roll, total_attack, target_ac):
-    if roll == 1:
-        return False
-    if roll == 20:
-        return True
-    return total_attack >= target_ac
+
+def roll_attack_bonus_dice(player):
+    bonus_total = 0
+    bonus_pieces = []
+    for label, dice in player.get("_attack_bonus_cache", []):
+        extra = roll_dice(dice)
+        bonus_total += extra
+        bonus_pieces.append(f" + {label} {extra}")
+    return bonus_total, "".join(bonus_pieces)
 
 
 def distribute_xp(contributions, total_xp):
     awards = {}
     if not total_xp or total_xp <= 0:
         return awards
-    filtered = {player: max(0, int(damage)) for player, damage in contributions.items() if damage > 0}
-    if not filtered:
-        return awards
+    filtered = {player: int(damage) for player, damage in contributions.items() if damage > 0}
     total_damage = sum(filtered.values())
     if total_damage <= 0:
         return awards
+    shares = []
     remaining = total_xp
-    ordered = sorted(filtered.items(), key=lambda item: item[1], reverse=True)
-    for username, damage in ordered:
-        share = int(total_xp * damage / total_damage)
-        if share > remaining:
-            share = remaining
-        awards[username] = share
+    for index, (username, damage) in enumerate(filtered.items()):
+        share, leftover = divmod(total_xp * damage, total_damage)
+        if share > 0:
+            awards[username] = share
         remaining -= share
-    idx = 0
-    while remaining > 0 and ordered:
-        username = ordered[idx % len(ordered)][0]
+        shares.append((leftover, damage, -index, username))
+    # Largest-remainder handout: remaining is always < len(shares), so each
+    # contributor gets at most one extra point. Ties go to the earliest contributor.
+    for _, _, _, username in heapq.nlargest(remaining, shares):
         awards[username] = awards.get(username, 0) + 1
-        remaining -= 1
-        idx += 1
-    return {user: amount for user, amount in awards.items() if amount > 0}
+    return awards
 
 
 def award_xp(username, amount):
@@ -2273,7 +2812,7 @@ def award_xp(username, amount):
     if player:
         player["xp"] = player.get("xp", 0) + amount
         update_character_xp(player["character_id"], player["xp"])
-        notify_player(username, f"You gain {amount} XP.")
+        _notify_player(player, f"You gain {amount} XP.")
     else:
         record = get_character_by_name(username)
         if record is None:
@@ -2304,7 +2843,7 @@ def collect_item_for_player(player, username, item_key):
     return item_key.replace("_", " ").title()
 
 
-def handle_mob_defeat(mob, killer_name=None):
+def handle_mob_defeat(mob, killer_name=None, messages=None):
     if not mob or not mob.get("alive"):
         return
     mob["alive"] = False
@@ -2312,21 +2851,12 @@ def handle_mob_defeat(mob, killer_name=None):
     x, y = mob["x"], mob["y"]
     zone = mob.get("zone", DEFAULT_ZONE)
     room = room_name(zone, x, y)
-    socketio.emit(
-        "system_message",
-        {"text": f"{mob['name']} is slain!"},
-        room=room,
-    )
-    contributions = mob.get("contributions", {})
-    xp_total = mob.get("xp", 0)
-    awards = distribute_xp(contributions, xp_total)
-    if awards:
-        for username, amount in awards.items():
-            award_xp(username, amount)
+    messages = list(messages or [])
+    messages.append(f"{mob['name']} is slain!")
     gold_min, gold_max = mob.get("gold_range", (0, 0))
     drops = []
     if gold_max and gold_max >= gold_min and gold_max > 0:
-        gold_amount = random.randint(gold_min, gold_max)
+        gold_amount = _rng.randint(gold_min, gold_max)
         if gold_amount > 0:
             gold_entry = generate_loot_entry_gold(gold_amount)
             add_loot_to_room(zone, x, y, gold_entry)
@@ -2338,18 +2868,22 @@ def handle_mob_defeat(mob, killer_name=None):
         else:
             item_key = entry
             chance = 1.0
-        if random.random() <= chance:
+        if _rng.random() <= chance:
             loot_entry = generate_loot_entry_item(item_key)
             add_loot_to_room(zone, x, y, loot_entry)
             drops.append(loot_entry)
     if drops:
         names = ", ".join(drop["name"] for drop in drops)
-        socketio.emit(
-            "system_message",
-            {"text": f"Treasure spills onto the ground: {names}."},
-            room=room,
-        )
+        messages.append(f"Treasure spills onto the ground: {names}.")
+    emit_messages(room, messages)
+    contributions = mob.get("contributions", {})
+    xp_total = mob.get("xp", 0)
+    awards = distribute_xp(contributions, xp_total)
+    if awards:
+        for username, amount in awards.items():
+            award_xp(username, amount)
     mobs.pop(mob["id"], None)
+    unindex_mob(mob)
     if mob.get("is_npc"):
         npc_key = npc_lookup_by_id.pop(mob["id"], None)
         if npc_key:
@@ -2361,22 +2895,16 @@ def handle_mob_defeat(mob, killer_name=None):
 def resolve_attack_against_mob(attacker_name, attacker, mob):
     engage_mob_with_player(mob, attacker_name)
     recalculate_player_stats(attacker)
-    roll = random.randint(1, 20)
+    roll = _rng.randrange(20) + 1
     crit = roll == 20
     attack_bonus = attacker["attack_bonus"]
-    bonus_rolls = []
-    bonus_total = 0
-    for bonus in attacker.get("attack_roll_bonus_dice", []):
-        extra = roll_dice(bonus.get("dice"))
-        bonus_total += extra
-        label = bonus.get("label") or format_dice(bonus.get("dice"))
-        bonus_rolls.append((label, extra))
+    bonus_total, bonus_text = roll_attack_bonus_dice(attacker)
     total_attack = roll + attack_bonus + bonus_total
-    zone = attacker.get("zone", DEFAULT_ZONE)
-    room = room_name(zone, attacker["x"], attacker["y"])
-    if not attack_roll_success(roll, total_attack, mob["ac"]):
-        bonus_text = "".join(f" + {label} {value}" for label, value in bonus_rolls)
-        socketio.emit(
+    zone, x, y = get_player_location(attacker)
+    room = room_name(zone, x, y)
+    # Natural 1 always misses, natural 20 (crit) always hits.
+    if roll == 1 or not (crit or total_attack >= mob["ac"]):
+        send_event(
             "system_message",
             {
                 "text": f"{attacker_name} strikes at {mob['name']} but misses (roll {roll} + {attack_bonus}{bonus_text} = {total_attack} vs AC {mob['ac']}).",
@@ -2386,25 +2914,20 @@ def resolve_attack_against_mob(attacker_name, attacker, mob):
         return
     ability_key = attacker.get("attack_ability", "str")
     ability_mod = attacker["ability_mods"].get(ability_key, 0)
-    damage = roll_weapon_damage(
-        attacker["weapon"], ability_mod, crit=crit, bonus_damage=attacker.get("damage_bonus", 0)
-    )
+    damage = attacker["_damage_roll"](ability_mod + attacker.get("damage_bonus", 0), crit)
     mob["hp"] = max(0, mob["hp"] - damage)
     contributions = mob.setdefault("contributions", {})
     contributions[attacker_name] = contributions.get(attacker_name, 0) + damage
-    bonus_text = "".join(f" + {label} {value}" for label, value in bonus_rolls)
     attack_detail = f"roll {roll}{' - critical!' if crit else ''} + {attack_bonus}{bonus_text} = {total_attack}"
-    socketio.emit(
-        "system_message",
-        {
-            "text": f"{attacker_name} hits {mob['name']} with {attacker['weapon']['name']} for {damage} damage ({attack_detail}, AC {mob['ac']}).",
-        },
-        room=room,
-    )
+    weapon_name = attacker["weapon"]["name"]
+    messages = [
+        f"{attacker_name} hits {mob['name']} with {weapon_name} for {damage} damage ({attack_detail}, AC {mob['ac']}).",
+    ]
     if mob["hp"] <= 0:
-        handle_mob_defeat(mob, killer_name=attacker_name)
+        handle_mob_defeat(mob, killer_name=attacker_name, messages=messages)
     else:
-        broadcast_room_state(attacker["x"], attacker["y"])
+        emit_messages(room, messages)
+        broadcast_room_state(zone, x, y)
 
 
 def pickup_loot(username, loot_identifier):
@@ -2414,19 +2937,13 @@ def pickup_loot(username, loot_identifier):
     if not loot_identifier:
         return False, "Specify which loot to take."
     loot_identifier = loot_identifier.strip().lower()
-    x, y = player["x"], player["y"]
-    zone = player.get("zone", DEFAULT_ZONE)
-    entries = room_loot.get((zone, x, y), [])
-    match = None
-    for entry in entries:
-        if entry["id"].lower() == loot_identifier:
-            match = entry
-            break
+    zone, x, y = get_player_location(player)
+    entries = room_loot.get((zone, x, y))
+    match = entries.pop(loot_identifier, None) if entries else None
     if not match:
         return False, "No such loot lies here."
-    room_loot[(zone, x, y)].remove(match)
-    if not room_loot[(zone, x, y)]:
-        room_loot.pop((zone, x, y), None)
+    if not entries:
+        del room_loot[(zone, x, y)]
     room = room_name(zone, x, y)
     if match.get("type") == "gold":
         amount = int(match.get("amount") or 0)
@@ -2456,11 +2973,38 @@ def pickup_loot(username, loot_identifier):
             update_character_items(player["character_id"], items)
             item_name = match.get("name", "an item")
             message = f"{username} picks up {item_name}."
-    socketio.emit("system_message", {"text": message}, room=room)
+    send_event("system_message", {"text": message}, room=room)
     broadcast_room_state(zone, x, y)
     return True, message
 
 
+def _searched_room_bit(zone, x, y):
+    width, _ = get_world_dimensions(zone)
+    index = y * max(width, 1) + x
+    return index >> 3, 1 << (index & 7)
+
+
+def has_searched_room(player, zone, x, y):
+    bits = (player.get("searched_rooms") or {}).get(zone)
+    if not bits:
+        return False
+    offset, mask = _searched_room_bit(zone, x, y)
+    return offset < len(bits) and bool(bits[offset] & mask)
+
+
+def mark_room_searched(player, zone, x, y):
+    """Record a cleared search in the player's per-zone bitmap (one bit per room)."""
+    searched = player.setdefault("searched_rooms", {})
+    bits = searched.get(zone)
+    if bits is None:
+        width, height = get_world_dimensions(zone)
+        bits = searched[zone] = bytearray((width * height + 7) // 8)
+    offset, mask = _searched_room_bit(zone, x, y)
+    if offset >= len(bits):
+        bits.extend(bytes(offset + 1 - len(bits)))
+    bits[offset] |= mask
+
+
 def perform_search_action(username):
     player = players.get(username)
     if not player:
@@ -2474,11 +3018,9 @@ def perform_search_action(username):
     search_meta = room.get("search")
 
     mark_player_action(player)
-    searched_rooms = player.setdefault("searched_rooms", set())
-    location_key = (zone, x, y)
 
     if not search_meta:
-        notify_player(username, "You search around but find nothing unusual.")
+        _notify_player(player, "You search around but find nothing unusual.")
         return True, None
 
     ability_key = (search_meta.get("ability") or "wis").lower()
@@ -2487,20 +3029,20 @@ def perform_search_action(username):
         dc = int(search_meta.get("dc", 10))
     except (TypeError, ValueError):
         dc = 10
-    roll = random.randint(1, 20)
+    roll = _rng.randrange(20) + 1
     total = roll + ability_mod
     detail = f" (Roll {total} vs DC {dc})"
 
     if total >= dc:
         success_text = search_meta.get("success_text") or "You uncover something hidden."
-        notify_player(username, success_text + detail)
-        already_cleared = location_key in searched_rooms
+        _notify_player(player, success_text + detail)
+        already_cleared = has_searched_room(player, zone, x, y)
         if already_cleared:
             loot_keys = search_meta.get("loot") or []
             if loot_keys:
-                notify_player(username, "You have already recovered the valuables hidden here.")
+                _notify_player(player, "You have already recovered the valuables hidden here.")
             return True, None
-        searched_rooms.add(location_key)
+        mark_room_searched(player, zone, x, y)
         loot_keys = search_meta.get("loot") or []
         if loot_keys:
             awarded = []
@@ -2509,11 +3051,11 @@ def perform_search_action(username):
                 if item_name:
                     awarded.append(item_name)
             if awarded:
-                notify_player(username, "You obtain " + ", ".join(awarded) + ".")
+                _notify_player(player, "You obtain " + ", ".join(awarded) + ".")
         return True, None
 
     failure_text = search_meta.get("failure_text") or "You search around but find nothing unusual."
-    notify_player(username, failure_text + detail)
+    _notify_player(player, failure_text + detail)
     return True, None
 
 
@@ -2524,12 +3066,12 @@ def resolve_attack(attacker_name, target_name):
     if not check_player_action_gate(attacker_name):
         return
     if not target_name:
-        notify_player(attacker_name, "Choose a target to attack.")
+        _notify_player(attacker, "Choose a target to attack.")
         return
 
     target_name = target_name.strip()
     if attacker_name == target_name:
-        notify_player(attacker_name, "You cannot attack yourself.")
+        _notify_player(attacker, "You cannot attack yourself.")
         return
 
     target = players.get(target_name)
@@ -2540,34 +3082,27 @@ def resolve_attack(attacker_name, target_name):
             mark_player_action(attacker)
             resolve_attack_against_mob(attacker_name, attacker, mob)
             return
-        notify_player(attacker_name, f"{target_name} is nowhere to be found.")
+        _notify_player(attacker, f"{target_name} is nowhere to be found.")
         return
 
     if attacker_zone != target.get("zone", DEFAULT_ZONE) or attacker["x"] != target["x"] or attacker["y"] != target["y"]:
-        notify_player(attacker_name, f"{target_name} is not in the same room.")
+        _notify_player(attacker, f"{target_name} is not in the same room.")
         return
 
     recalculate_player_stats(attacker)
     recalculate_player_stats(target)
     mark_player_action(attacker)
 
-    roll = random.randint(1, 20)
+    roll = _rng.randrange(20) + 1
     crit = roll == 20
     attack_bonus = attacker["attack_bonus"]
-    bonus_rolls = []
-    bonus_total = 0
-    for bonus in attacker.get("attack_roll_bonus_dice", []):
-        extra = roll_dice(bonus.get("dice"))
-        bonus_total += extra
-        label = bonus.get("label") or format_dice(bonus.get("dice"))
-        bonus_rolls.append((label, extra))
+    bonus_total, bonus_text = roll_attack_bonus_dice(attacker)
     total_attack = roll + attack_bonus + bonus_total
     target_ac = target["ac"]
     room = room_name(attacker_zone, attacker["x"], attacker["y"])
 
-    if not attack_roll_success(roll, total_attack, target_ac):
-        bonus_text = "".join(f" + {label} {value}" for label, value in bonus_rolls)
-        socketio.emit(
+    if roll == 1 or not (crit or total_attack >= target_ac):
+        send_event(
             "system_message",
             {
                 "text": f"{attacker_name} attacks {target_name} but misses "
@@ -2579,35 +3114,26 @@ def resolve_attack(attacker_name, target_name):
 
     ability_key = attacker["weapon"].get("ability") or attacker["attack_ability"]
     ability_mod = attacker["ability_mods"].get(ability_key, 0)
-    damage = roll_weapon_damage(
-        attacker["weapon"], ability_mod, crit=crit, bonus_damage=attacker.get("damage_bonus", 0)
-    )
+    damage = attacker["_damage_roll"](ability_mod + attacker.get("damage_bonus", 0), crit)
     target["hp"] = clamp_hp(target["hp"] - damage, target["max_hp"])
-    update_character_current_hp(target["character_id"], target["hp"])
+    queue_character_current_hp(target["character_id"], target["hp"])
 
-    bonus_text = "".join(f" + {label} {value}" for label, value in bonus_rolls)
     attack_detail = (
         f"roll {roll}{' - critical!' if crit else ''} + {attack_bonus}{bonus_text} = {total_attack}"
     )
 
-    socketio.emit(
-        "system_message",
-        {
-            "text": f"{attacker_name} hits {target_name} with {attacker['weapon']['name']} "
-            f"for {damage} damage ({attack_detail}, AC {target_ac})."
-        },
-        room=room,
-    )
+    weapon_name = attacker["weapon"]["name"]
+    messages = [
+        f"{attacker_name} hits {target_name} with {weapon_name} "
+        f"for {damage} damage ({attack_detail}, AC {target_ac})."
+    ]
+    if target["hp"] == 0:
+        messages.append(f"{target_name} collapses from their wounds!")
+    emit_messages(room, messages)
 
-    send_room_state(attacker_name)
-    send_room_state(target_name)
+    send_room_states(attacker, target)
 
     if target["hp"] == 0:
-        socketio.emit(
-            "system_message",
-            {"text": f"{target_name} collapses from their wounds!"},
-            room=room,
-        )
         respawn_player(target_name)
 
 
@@ -2632,7 +3158,7 @@ def login():
             return redirect(url_for("login"))
         elif action == "login":
             account = get_account(username)
-            if not account or not check_password_hash(account["password_hash"], password):
+            if not account or not verify_account_password(account, password):
                 flash("Invalid username or password.")
                 return redirect(url_for("login"))
             session.clear()
@@ -2684,12 +3210,10 @@ def new_character():
             session["rolled_scores"] = generate_base_scores()
             return redirect(url_for("new_character"))
         elif action == "create":
-            if count_account_characters(account_id) >= MAX_CHARACTERS_PER_ACCOUNT:
+            if character_count >= MAX_CHARACTERS_PER_ACCOUNT:
                 flash("You already have the maximum number of characters.")
                 return redirect(url_for("character_select"))
             name = request.form.get("name", "").strip()
-            race_choice = request.form.get("race")
-            class_choice = request.form.get("char_class")
             bio = (request.form.get("bio") or "").strip()
             description = (request.form.get("description") or "").strip()
             if not name:
@@ -2698,27 +3222,25 @@ def new_character():
             if len(name) > 40:
                 flash("Character names must be 40 characters or fewer.")
                 return redirect(url_for("new_character"))
-            if get_character_by_name(name):
-                flash("Character name already taken.")
+            if len(bio) > 500 or len(description) > 1000:
+                flash("Bio or description is too long.")
                 return redirect(url_for("new_character"))
-            race_choice = normalize_choice(race_choice, RACES, None)
-            class_choice = normalize_choice(class_choice, CLASSES, None)
+            race_choice = normalize_choice(request.form.get("race"), RACE_LOOKUP, None)
+            class_choice = normalize_choice(request.form.get("char_class"), CLASS_LOOKUP, None)
             if not race_choice or not class_choice:
                 flash("Select a valid race and class.")
                 return redirect(url_for("new_character"))
-            ability_scores = {}
             try:
-                for ability in ABILITY_KEYS:
-                    raw = request.form.get(f"ability_{ability}")
-                    if raw is None or raw.strip() == "":
-                        raw = rolls.get(ability)
-                    value = int(raw)
-                    ability_scores[ability] = max(1, min(value, 30))
+                values = [
+                    int((request.form.get(f"ability_{ability}") or "").strip() or rolls[ability])
+                    for ability in ABILITY_KEYS
+                ]
             except (TypeError, ValueError):
                 flash("Ability scores must be numbers.")
                 return redirect(url_for("new_character"))
-            if len(bio) > 500 or len(description) > 1000:
-                flash("Bio or description is too long.")
+            ability_scores = dict(zip(ABILITY_KEYS, (max(1, min(value, 30)) for value in values)))
+            if get_character_by_name(name):
+                flash("Character name already taken.")
                 return redirect(url_for("new_character"))
             create_character(account_id, name, race_choice, class_choice, ability_scores, bio, description)
             session.pop("rolled_scores", None)
@@ -2750,7 +3272,7 @@ def play_character(character_id):
     existing = players.get(record["name"])
     if existing:
         update_character_current_hp(existing["character_id"], existing["hp"])
-        players.pop(record["name"], None)
+        remove_player(record["name"])
     return redirect(url_for("game"))
 
 
@@ -2762,7 +3284,7 @@ def delete_character_route(character_id):
     if not record or record["account_id"] != session["account_id"]:
         flash("Character not found.")
         return redirect(url_for("character_select"))
-    players.pop(record["name"], None)
+    remove_player(record["name"])
     if session.get("character_id") == character_id:
         session.pop("character_id", None)
         session.pop("character_name", None)
@@ -2791,7 +3313,7 @@ def logout():
     character_name = session.get("character_name")
     if character_name and character_name in players:
         update_character_current_hp(players[character_name]["character_id"], players[character_name]["hp"])
-        players.pop(character_name, None)
+        remove_player(character_name)
     session.clear()
     return redirect(url_for("login"))
 
@@ -2803,7 +3325,7 @@ def on_connect():
     if "account_id" not in session or "character_id" not in session or "character_name" not in session:
         disconnect()
         return
-    emit("connected", {"message": "Connected to game server."})
+    send_event("connected", {"message": "Connected to game server."}, to=request.sid)
 
 
 @socketio.on("join_game")
@@ -2812,13 +3334,31 @@ def on_join_game():
     character_id = session.get("character_id")
     character_name = session.get("character_name")
     if not account_id or not character_id or not character_name:
-        emit("system_message", {"text": "You are not logged in. Please reconnect."})
+        send_event("system_message", {"text": "You are not logged in. Please reconnect."}, to=request.sid)
         disconnect()
         return
 
-    record = get_character_by_id(character_id)
+    existing = players.get(character_name)
+    if existing and existing.get("character_id") == character_id and existing.get("account_id") == account_id:
+        # Reconnect: the live state is newer than the stored row, so skip the fetch and rebuild.
+        # Rebind the same dict so background loops holding it keep updating the live player.
+        old_sid = existing.get("sid")
+        if sid_to_name.get(old_sid) == character_name:
+            del sid_to_name[old_sid]
+        room_state_cache.pop(old_sid, None)
+        existing["sid"] = request.sid
+        register_player(character_name, existing)
+        _enter_game_world(character_name, existing)
+        return
+
+    # HP queued by a just-closed socket may not be flushed yet; prefer it over the stored row.
+    # Holding the flush lock keeps the row and the queue consistent with each other.
+    with _character_write_lock:
+        record = get_character_by_id(character_id)
+        if record:
+            record.update(_dirty_characters.get(record["character_id"]) or {})
     if not record or record.get("account_id") != account_id or record.get("name") != character_name:
-        emit("system_message", {"text": "Unable to load your character. Please log in again."})
+        send_event("system_message", {"text": "Unable to load your character. Please log in again."}, to=request.sid)
         disconnect()
         return
 
@@ -2830,31 +3370,36 @@ def on_join_game():
         start_x, start_y = get_world_start(preserved_zone)
         preserved_position = (existing.get("x", start_x), existing.get("y", start_y))
         preserved_hp = clamp_hp(existing.get("hp"), existing.get("max_hp", 1))
-        preserved_effects = list(existing.get("active_effects", []))
-        preserved_cooldowns = dict(existing.get("cooldowns", {}))
+        # ``existing`` is replaced by ``state`` below, so its containers move over without copying.
+        preserved_effects = existing.get("active_effects") or []
+        preserved_cooldowns = existing.get("cooldowns") or {}
         state = build_player_state(record, request.sid)
-        state["zone"] = preserved_zone
-        state["x"], state["y"] = preserved_position
+        set_player_location(state, preserved_zone, *preserved_position)
         state["hp"] = preserved_hp
         state["active_effects"] = preserved_effects
         state["cooldowns"] = preserved_cooldowns
         state["last_action_ts"] = existing.get("last_action_ts", 0)
-        state["searched_rooms"] = set(existing.get("searched_rooms", set()))
+        state["searched_rooms"] = existing.get("searched_rooms") or {}
+        mark_player_stats_dirty(state)
         recalculate_player_stats(state)
 
     state["character_id"] = record["character_id"]
     state["account_id"] = account_id
     state["name"] = record["name"]
-    players[character_name] = state
+    register_player(character_name, state)
+    _enter_game_world(character_name, state)
 
+
+def _enter_game_world(character_name, state):
     x = state["x"]
     y = state["y"]
     zone = state.get("zone", DEFAULT_ZONE)
     rname = room_name(zone, x, y)
 
-    join_room(rname)
+    join_channel(rname)
 
-    emit("system_message", {"text": f"{character_name} has entered the room."}, room=rname, include_self=False)
+    if count_players_in_room(zone, x, y) > 1:
+        send_event("system_message", {"text": f"{character_name} has entered the room."}, room=rname, include_self=False)
 
     send_room_state(character_name)
     trigger_aggressive_mobs_for_player(character_name, x, y)
@@ -2887,19 +3432,18 @@ def handle_travel_portal(username):
 
     origin_zone = zone
     source_room = room_name(origin_zone, x, y)
-    leave_room(source_room)
-    socketio.emit(
+    leave_channel(source_room)
+    send_event(
         "system_message",
         {"text": f"{username} presses the warp stone and vanishes in a burst of light."},
         room=source_room,
     )
     broadcast_room_state(origin_zone, x, y)
 
-    player["zone"] = target_zone
-    player["x"], player["y"] = tx, ty
+    set_player_location(player, target_zone, tx, ty)
     destination_room = room_name(target_zone, tx, ty)
-    join_room(destination_room)
-    socketio.emit(
+    join_channel(destination_room)
+    send_event(
         "system_message",
         {"text": f"{username} coalesces beside the warp stone in a shimmer of light."},
         room=destination_room,
@@ -2907,159 +3451,150 @@ def handle_travel_portal(username):
     )
     world_name = target_world.get("name", target_zone.title())
     dest_info = get_room_info(target_zone, tx, ty)
-    notify_player(username, f"The warp stone pulls you to {world_name}: {dest_info['name']}.")
-    send_room_state(username)
+    _notify_player(player, f"The warp stone pulls you to {world_name}: {dest_info['name']}.")
     trigger_aggressive_mobs_for_player(username, tx, ty)
+    # Covers the arriving player as well as everyone already in the destination room.
     broadcast_room_state(target_zone, tx, ty)
     return True
 
 
 @socketio.on("move")
 def on_move(data):
-    username = session.get("character_name")
-    if not username or username not in players:
-        return
-    if not check_player_action_gate(username):
-        return
+    with batched_emits():
+        username = session.get("character_name")
+        if not username or username not in players:
+            return
+        if not check_player_action_gate(username):
+            return
 
-    direction = (data.get("direction") or "").lower()
-    player = players[username]
-    old_x, old_y = player["x"], player["y"]
-    zone = player.get("zone", DEFAULT_ZONE)
-    width, height = get_world_dimensions(zone)
-    if direction not in DIRECTION_VECTORS:
-        return
-    dx, dy = DIRECTION_VECTORS[direction]
-    new_x, new_y = old_x + dx, old_y + dy
+        direction = (data.get("direction") or "").lower()
+        player = players[username]
+        zone, old_x, old_y = get_player_location(player)
+        x_range, y_range = get_player_world_ranges(player)
+        if direction not in DIRECTION_VECTORS:
+            return
+        dx, dy = DIRECTION_VECTORS[direction]
+        new_x, new_y = old_x + dx, old_y + dy
 
-    # Bounds check
-    if not (0 <= new_x < width and 0 <= new_y < height):
-        emit("system_message", {"text": "You cannot go that way."})
-        return
+        # Bounds check (range.__contains__ is a single C-level comparison pair)
+        if new_x not in x_range or new_y not in y_range:
+            send_event("system_message", {"text": "You cannot go that way."}, to=request.sid)
+            return
 
-    door_id = get_door_id(zone, old_x, old_y, direction)
-    if door_id and not is_door_open(door_id):
-        door = DOORS.get(door_id)
-        door_name = door.get("name") if door else "The door"
-        notify_player(username, f"{door_name} is closed.")
-        send_room_state(username)
-        return
+        door_id = get_door_id(zone, old_x, old_y, direction)
+        if door_id and not is_door_open(door_id):
+            door = DOORS.get(door_id)
+            door_name = door.get("name") if door else "The door"
+            _notify_player(player, f"{door_name} is closed.")
+            _send_room_state(player)
+            return
 
-    old_room = room_name(zone, old_x, old_y)
-    new_room = room_name(zone, new_x, new_y)
+        old_room = room_name(zone, old_x, old_y)
+        new_room = room_name(zone, new_x, new_y)
 
-    if (new_x, new_y) == (old_x, old_y):
-        # no move
-        return
+        if (new_x, new_y) == (old_x, old_y):
+            # no move
+            return
 
-    # Update player position
-    disengage_player_from_room_mobs(username, old_x, old_y)
-    player["x"], player["y"] = new_x, new_y
+        # Update player position
+        disengage_player_from_room_mobs(username, old_x, old_y)
+        set_player_location(player, zone, new_x, new_y)
 
-    # Leave old room, notify others
-    leave_room(old_room)
-    emit("system_message", {"text": f"{username} has left the room."}, room=old_room)
+        # Leave old room, notify others
+        leave_channel(old_room)
+        if room_has_players(zone, old_x, old_y):
+            send_event("system_message", {"text": f"{username} has left the room."}, room=old_room)
 
-    # Join new room, notify others
-    join_room(new_room)
-    emit("system_message", {"text": f"{username} has entered the room."}, room=new_room, include_self=False)
+        # Join new room, notify others
+        join_channel(new_room)
+        if count_players_in_room(zone, new_x, new_y) > 1:
+            send_event("system_message", {"text": f"{username} has entered the room."}, room=new_room, include_self=False)
 
-    # Send new room state to moving player
-    mark_player_action(player)
-    send_room_state(username)
-    trigger_aggressive_mobs_for_player(username, player["x"], player["y"])
+        # Send new room state to moving player
+        mark_player_action(player)
+        _send_room_state(player)
+        trigger_aggressive_mobs_for_player(username, player["x"], player["y"])
 
 
 @socketio.on("activate_warp")
 def on_activate_warp():
-    username = session.get("character_name")
-    if not username or username not in players:
-        return
-    if not check_player_action_gate(username):
-        return
+    with batched_emits():
+        username = session.get("character_name")
+        if not username or username not in players:
+            return
+        if not check_player_action_gate(username):
+            return
 
-    player = players[username]
-    zone = player.get("zone", DEFAULT_ZONE)
-    x, y = player["x"], player["y"]
-    room = get_room_info(zone, x, y)
-    if not room.get("travel_to"):
-        notify_player(username, "No warp stone responds in this room.")
-        send_room_state(username)
-        return
+        player = players[username]
+        zone = player.get("zone", DEFAULT_ZONE)
+        x, y = player["x"], player["y"]
+        room = get_room_info(zone, x, y)
+        if not room.get("travel_to"):
+            _notify_player(player, "No warp stone responds in this room.")
+            _send_room_state(player)
+            return
 
-    mark_player_action(player)
-    if not handle_travel_portal(username):
-        notify_player(username, "The warp stone flickers but does not take hold.")
-        send_room_state(username)
+        mark_player_action(player)
+        if not handle_travel_portal(username):
+            _notify_player(player, "The warp stone flickers but does not take hold.")
+            _send_room_state(player)
 
 
 @socketio.on("door_action")
 def on_door_action(data):
-    username = session.get("character_name")
-    if not username or username not in players:
-        return
-    if not check_player_action_gate(username):
-        return
-
-    payload = data or {}
-    door_id = payload.get("door_id")
-    action = (payload.get("action") or "").lower()
-    door = DOORS.get(door_id)
-    if not door:
-        notify_player(username, "That door does not seem to exist.")
-        return
+    with batched_emits():
+        username = session.get("character_name")
+        if not username or username not in players:
+            return
+        if not check_player_action_gate(username):
+            return
 
-    player = players[username]
-    zone = player.get("zone", DEFAULT_ZONE)
-    coords = (player["x"], player["y"])
-    facing = None
-    for endpoint in door.get("endpoints", []):
-        if endpoint["zone"] == zone and endpoint["coords"] == coords:
-            facing = endpoint["direction"]
-            break
-    if not facing:
-        notify_player(username, "You are not close enough to that door.")
-        send_room_state(username)
-        return
+        player = players[username]
+        payload = data or {}
+        door_id = payload.get("door_id")
+        action = (payload.get("action") or "").lower()
+        door = DOORS.get(door_id)
+        if not door:
+            _notify_player(player, "That door does not seem to exist.")
+            return
 
-    if action == "open":
-        if door.get("state") == "open":
-            notify_player(username, f"The {door['name']} is already open.")
+        location = get_player_location(player)
+        facing = door["endpoint_index"].get(location)
+        if not facing:
+            _notify_player(player, "You are not close enough to that door.")
+            _send_room_state(player)
             return
-        door["state"] = "open"
-        verb = "opens"
-        feedback = f"You swing the {door['name']} open."
-    elif action == "close":
-        if door.get("state") == "closed":
-            notify_player(username, f"The {door['name']} is already closed.")
+
+        if action == "open":
+            if door.get("state") == "open":
+                _notify_player(player, f"The {door['name']} is already open.")
+                return
+            set_door_state(door, "open")
+            verb = "opens"
+            feedback = f"You swing the {door['name']} open."
+        elif action == "close":
+            if door.get("state") == "closed":
+                _notify_player(player, f"The {door['name']} is already closed.")
+                return
+            set_door_state(door, "closed")
+            verb = "closes"
+            feedback = f"You pull the {door['name']} closed."
+        else:
+            _notify_player(player, "You must choose to open or close the door.")
             return
-        door["state"] = "closed"
-        verb = "closes"
-        feedback = f"You pull the {door['name']} closed."
-    else:
-        notify_player(username, "You must choose to open or close the door.")
-        return
 
-    mark_player_action(player)
-    notify_player(username, feedback)
+        mark_player_action(player)
+        _notify_player(player, feedback)
 
-    touched_rooms = set()
-    for endpoint in door.get("endpoints", []):
-        z = endpoint["zone"]
-        ex, ey = endpoint["coords"]
-        room_key = (z, ex, ey)
-        if room_key in touched_rooms:
-            continue
-        touched_rooms.add(room_key)
-        room_channel = room_name(z, ex, ey)
-        include_self = not (z == zone and (ex, ey) == coords)
-        socketio.emit(
-            "system_message",
-            {"text": f"{username} {verb} the {door['name']}."},
-            room=room_channel,
-            include_self=include_self,
-        )
-        broadcast_room_state(z, ex, ey)
+        for room_key in door["broadcast_rooms"]:
+            z, ex, ey = room_key
+            send_event(
+                "system_message",
+                {"text": f"{username} {verb} the {door['name']}."},
+                room=room_name(z, ex, ey),
+                include_self=room_key != location,
+            )
+            broadcast_room_state(z, ex, ey)
 
 
 @socketio.on("equip_weapon")
@@ -3081,9 +3616,10 @@ def on_cast_spell(data):
     payload = data or {}
     spell_identifier = payload.get("spell") or payload.get("spell_key") or payload.get("name")
     target = payload.get("target") or payload.get("target_name")
-    success, message = cast_spell_for_player(username, spell_identifier, target)
-    if not success and message:
-        notify_player(username, message)
+    with batched_emits():
+        success, message = cast_spell_for_player(username, spell_identifier, target)
+        if not success and message:
+            notify_player(username, message)
 
 
 @socketio.on("pickup_loot")
@@ -3110,52 +3646,64 @@ def on_search_event(data):
 
 @socketio.on("chat")
 def on_chat(data):
-    username = session.get("character_name")
-    if not username or username not in players:
-        return
+    with batched_emits():
+        username = session.get("character_name")
+        if not username or username not in players:
+            return
 
-    text = (data.get("text") or "").strip()
-    if not text:
-        return
+        text = (data.get("text") or "").strip()
+        if not text:
+            return
 
-    if text.startswith("/"):
-        handled = handle_command(username, text[1:])
-        if handled:
+        if text.startswith("/"):
+            handled = handle_command(username, text[1:])
+            if handled:
+                return
+
+        player = players[username]
+        zone, x, y = get_player_location(player)
+        payload = {"from": username, "text": text}
+        # A speaker alone in the room only needs their own echo.
+        if count_players_in_room(zone, x, y) <= 1:
+            send_event("chat_message", payload, to=request.sid)
             return
+        send_event("chat_message", payload, room=room_name(zone, x, y))
 
-    player = players[username]
-    x, y = player["x"], player["y"]
-    zone = player.get("zone", DEFAULT_ZONE)
-    rname = room_name(zone, x, y)
 
-    emit("chat_message", {"from": username, "text": text}, room=rname)
+@socketio.on("resync")
+def on_resync():
+    username = session.get("character_name")
+    player = players.get(username) if username else None
+    if not player or player["sid"] != request.sid:
+        return
+    room_state_cache.pop(request.sid, None)
+    _send_room_state(player)
 
 
 @socketio.on("disconnect")
 def on_disconnect():
-    # We can try to identify the user by sid
-    username = None
-    for u, p in list(players.items()):
-        if p["sid"] == request.sid:
-            username = u
-            break
-
-    if username:
-        player = players.get(username)
-        if player:
-            x, y = player["x"], player["y"]
-            zone = player.get("zone", DEFAULT_ZONE)
-            rname = room_name(zone, x, y)
-        else:
-            rname = None
-            x = y = 0
+    username = sid_to_name.get(request.sid)
+    player = players.get(username) if username else None
+    if player:
+        zone, x, y = get_player_location(player)
+        rname = room_name(zone, x, y)
         disengage_player_from_room_mobs(username, x, y)
         # Notify others
-        if rname:
-            emit("system_message", {"text": f"{username} has disconnected."}, room=rname)
-        update_character_current_hp(players[username]["character_id"], players[username]["hp"])
+        send_event("system_message", {"text": f"{username} has disconnected."}, room=rname)
+        queue_character_current_hp(player["character_id"], player["hp"])
         # Remove from players (MVP: no persistent positions)
-        players.pop(username, None)
+        remove_player(username)
+
+
+class NoDelayHttpProtocol(eventlet_wsgi.HttpProtocol):
+    """Disable Nagle on accepted sockets so small combat frames are not held back."""
+
+    def setup(self):
+        super().setup()
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, AttributeError):
+            pass
 
 
 if not mobs:
@@ -3164,5 +3712,7 @@ if not mobs:
 
 if __name__ == "__main__":
     init_db()
+    # Treat SIGTERM (docker stop, deploys) like Ctrl+C so the server returns and atexit flushes HP.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     # Bind to 0.0.0.0 for container use
-    socketio.run(app, host="0.0.0.0", port=5000)
+    socketio.run(app, host="0.0.0.0", port=5000, protocol=NoDelayHttpProtocol)
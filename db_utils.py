@@ -5,12 +5,21 @@ from __future__ import annotations
 import json
 import os
 from functools import lru_cache
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine, Result
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency path
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch either the same way.
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 load_dotenv()
 
 _ENGINE: Optional[Engine] = None
@@ -36,33 +45,53 @@ def get_engine() -> Engine:
         )
 
     connection_url = f"mysql+pymysql://{user}:{password}@{host}:{port}/{name}"
-    _ENGINE = create_engine(connection_url, pool_pre_ping=True, future=True)
+    # Keep a warm pool of long-lived connections. Recycling them before MariaDB's
+    # wait_timeout lets deployments turn off the per-checkout ping round trip, and
+    # LIFO checkout keeps reusing the most recently active (hottest) connections.
+    _ENGINE = create_engine(
+        connection_url,
+        pool_size=int(os.environ.get("DB_POOL_SIZE", "25")),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "25")),
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=os.environ.get("DB_POOL_PRE_PING", "1") != "0",
+        pool_use_lifo=True,
+        future=True,
+    )
     return _ENGINE
 
 
+@lru_cache(maxsize=256)
+def _statement(query: str):
+    """Parse each SQL string into a reusable ``text()`` clause once."""
+
+    return text(query)
+
+
 def _execute(query: str, **params: Any) -> Result:
     engine = get_engine()
     with engine.connect() as conn:
-        result = conn.execute(text(query), params)
+        result = conn.execute(_statement(query), params)
         conn.commit()
         return result
 
 
 def fetch_one(query: str, **params: Any) -> Optional[Dict[str, Any]]:
-    result = _execute(query, **params)
-    row = result.mappings().fetchone()
+    # Reads skip the COMMIT round trip; the pool rolls the connection back on return.
+    with get_engine().connect() as conn:
+        row = conn.execute(_statement(query), params).mappings().fetchone()
     return dict(row) if row else None
 
 
 def fetch_all(query: str, **params: Any) -> List[Dict[str, Any]]:
-    result = _execute(query, **params)
-    return [dict(row) for row in result.mappings().all()]
+    with get_engine().connect() as conn:
+        rows = conn.execute(_statement(query), params).mappings().all()
+    return [dict(row) for row in rows]
 
 
 def insert_and_return_id(query: str, **params: Any) -> int:
     engine = get_engine()
     with engine.begin() as conn:
-        result = conn.execute(text(query), params)
+        result = conn.execute(_statement(query), params)
         inserted = result.lastrowid
     return int(inserted or 0)
 
@@ -72,6 +101,18 @@ def execute(query: str, **params: Any) -> int:
     return int(getattr(result, "rowcount", 0))
 
 
+def execute_many(query: str, rows: Iterable[Dict[str, Any]]) -> int:
+    """Run one statement against many parameter sets in a single transaction."""
+
+    rows = list(rows)
+    if not rows:
+        return 0
+    engine = get_engine()
+    with engine.begin() as conn:
+        result = conn.execute(_statement(query), rows)
+    return int(getattr(result, "rowcount", 0))
+
+
 # --- Core lookup helpers -------------------------------------------------
 
 
@@ -116,13 +157,14 @@ def _parse_notes(notes: Optional[str]) -> Dict[str, Any]:
     if not notes:
         return {}
     try:
-        return json.loads(notes)
+        return _json_loads(notes)
     except (TypeError, json.JSONDecodeError):
         return {}
 
 
-def _room_search_payload(room: Dict[str, Any], loot_items: Iterable[str]) -> Optional[Dict[str, Any]]:
-    meta = _parse_notes(room.get("notes_gm"))
+def _room_search_payload(
+    room: Dict[str, Any], meta: Dict[str, Any], loot_items: Iterable[str]
+) -> Optional[Dict[str, Any]]:
     search_meta = meta.get("search") if isinstance(meta, dict) else None
     if not search_meta:
         if room.get("search_dc"):
@@ -144,8 +186,7 @@ def _room_search_payload(room: Dict[str, Any], loot_items: Iterable[str]) -> Opt
     return payload
 
 
-def _room_warp_payload(room: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    meta = _parse_notes(room.get("notes_gm"))
+def _room_warp_payload(meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     warp = meta.get("warp") if isinstance(meta, dict) else None
     if not warp:
         return None
@@ -171,7 +212,47 @@ def get_room_mob_spawn_records(room_id: int) -> List[Dict[str, Any]]:
     )
 
 
-def build_room_payload(room: Dict[str, Any]) -> Dict[str, Any]:
+def get_zone_room_loot_templates(zone_id: str) -> Dict[int, List[str]]:
+    records = fetch_all(
+        """
+        SELECT room_loot_tables.room_id, room_loot_tables.item_template_id
+        FROM room_loot_tables
+        JOIN rooms ON rooms.room_id = room_loot_tables.room_id
+        WHERE rooms.zone_id = :zone_id
+        ORDER BY room_loot_tables.room_loot_id
+        """,
+        zone_id=zone_id,
+    )
+    grouped: Dict[int, List[str]] = {}
+    for row in records:
+        grouped.setdefault(row["room_id"], []).append(row["item_template_id"])
+    return grouped
+
+
+def get_zone_mob_spawn_templates(zone_id: str) -> Dict[int, List[str]]:
+    records = fetch_all(
+        """
+        SELECT room_mob_spawns.room_id, room_mob_spawns.mob_template_id
+        FROM room_mob_spawns
+        JOIN rooms ON rooms.room_id = room_mob_spawns.room_id
+        WHERE rooms.zone_id = :zone_id
+        ORDER BY room_mob_spawns.room_mob_spawn_id
+        """,
+        zone_id=zone_id,
+    )
+    grouped: Dict[int, List[str]] = {}
+    for row in records:
+        grouped.setdefault(row["room_id"], []).append(row["mob_template_id"])
+    return grouped
+
+
+def build_room_payload(
+    room: Dict[str, Any],
+    loot_items: Optional[List[str]] = None,
+    mob_template_ids: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Build a room payload; pass pre-fetched loot/mob lists to avoid per-room queries."""
+
     room_payload: Dict[str, Any] = {
         "room_id": room["room_id"],
         "zone_id": room["zone_id"],
@@ -184,38 +265,44 @@ def build_room_payload(room: Dict[str, Any]) -> Dict[str, Any]:
         "is_safe": bool(room.get("is_safe_room")),
     }
 
-    loot_items = get_room_loot_templates(room["room_id"])
-    search_payload = _room_search_payload(room, loot_items)
+    meta = _parse_notes(room.get("notes_gm"))
+    if loot_items is None:
+        loot_items = get_room_loot_templates(room["room_id"])
+    search_payload = _room_search_payload(room, meta, loot_items)
     if search_payload:
         room_payload["search"] = search_payload
 
-    warp_payload = _room_warp_payload(room)
+    warp_payload = _room_warp_payload(meta)
     if warp_payload:
         room_payload.update(warp_payload)
 
-    spawn_records = get_room_mob_spawn_records(room["room_id"])
-    if spawn_records:
-        room_payload["mobs"] = [record["mob_template_id"] for record in spawn_records]
+    if mob_template_ids is None:
+        mob_template_ids = [record["mob_template_id"] for record in get_room_mob_spawn_records(room["room_id"])]
+    if mob_template_ids:
+        room_payload["mobs"] = mob_template_ids
 
     return room_payload
 
 
 @lru_cache(maxsize=32)
-def load_world(zone_id: str) -> Optional[Dict[str, Any]]:
+def load_world(zone_id: str) -> Optional[Mapping[str, Any]]:
+    """Return the cached, read-only world for a zone; callers share it without copying."""
     zone = get_zone(zone_id)
     if not zone:
         return None
 
     rooms = get_rooms_by_zone(zone_id)
     if not rooms:
-        return {
-            "zone_id": zone_id,
-            "name": zone.get("name"),
-            "map": [],
-            "width": 0,
-            "height": 0,
-            "start": (0, 0),
-        }
+        return MappingProxyType(
+            {
+                "zone_id": zone_id,
+                "name": zone.get("name"),
+                "map": (),
+                "width": 0,
+                "height": 0,
+                "start": (0, 0),
+            }
+        )
 
     max_x = max(room["x_coord"] for room in rooms)
     max_y = max(room["y_coord"] for room in rooms)
@@ -223,26 +310,35 @@ def load_world(zone_id: str) -> Optional[Dict[str, Any]]:
     height = max_y + 1
     grid: List[List[Dict[str, Any]]] = [[{} for _ in range(width)] for _ in range(height)]
     start = (0, 0)
+    # Two zone-wide queries instead of two per room.
+    loot_by_room = get_zone_room_loot_templates(zone_id)
+    mobs_by_room = get_zone_mob_spawn_templates(zone_id)
 
     for room in rooms:
-        payload = build_room_payload(room)
+        payload = build_room_payload(
+            room,
+            loot_by_room.get(room["room_id"], []),
+            mobs_by_room.get(room["room_id"], []),
+        )
         x, y = payload["x"], payload["y"]
         if 0 <= y < height and 0 <= x < width:
-            grid[y][x] = payload
+            grid[y][x] = MappingProxyType(payload)
         if payload.get("is_starting"):
             start = (x, y)
 
-    return {
-        "zone_id": zone_id,
-        "name": zone.get("name"),
-        "map": grid,
-        "width": width,
-        "height": height,
-        "start": start,
-    }
+    return MappingProxyType(
+        {
+            "zone_id": zone_id,
+            "name": zone.get("name"),
+            "map": tuple(tuple(row) for row in grid),
+            "width": width,
+            "height": height,
+            "start": start,
+        }
+    )
 
 
-def get_world(zone_id: str) -> Optional[Dict[str, Any]]:
+def get_world(zone_id: str) -> Optional[Mapping[str, Any]]:
     return load_world(zone_id)
 
 
@@ -260,7 +356,7 @@ def get_world_start(zone_id: str) -> Tuple[int, int]:
     return tuple(world.get("start", (0, 0)))
 
 
-def get_room_payload(zone_id: str, x: int, y: int) -> Optional[Dict[str, Any]]:
+def get_room_payload(zone_id: str, x: int, y: int) -> Optional[Mapping[str, Any]]:
     world = load_world(zone_id)
     if not world:
         return None
@@ -325,26 +421,47 @@ def create_mob_instance_record(
     )
 
 
+def create_mob_instance_records(rows: Iterable[Dict[str, Any]]) -> int:
+    """Insert many mob instances in one transaction; rows carry ``create_mob_instance_record``'s arguments."""
+
+    return execute_many(
+        """
+        INSERT INTO mob_instances (
+            mob_template_id, room_id, current_hp, status
+        ) VALUES (:template_id, :room_id, :current_hp, :status)
+        """,
+        ({"status": "alive", **row} for row in rows),
+    )
+
+
 # --- Item helpers -------------------------------------------------------
 
 
+@lru_cache(maxsize=1)
+def _all_item_templates() -> Dict[str, Dict[str, Any]]:
+    """Load every item template in one query; the weapon/general views partition it."""
+
+    records = fetch_all("SELECT * FROM item_templates")
+    return {record["item_template_id"]: record for record in records}
+
+
 def get_item_template(item_id: str) -> Optional[Dict[str, Any]]:
-    return fetch_one(
-        "SELECT * FROM item_templates WHERE item_template_id = :item_id",
-        item_id=item_id,
-    )
+    return _all_item_templates().get(item_id)
 
 
 @lru_cache(maxsize=1)
 def get_weapon_templates() -> Dict[str, Dict[str, Any]]:
-    records = fetch_all("SELECT * FROM item_templates WHERE item_type = 'weapon'")
-    return {record["item_template_id"]: record for record in records}
+    return {key: record for key, record in _all_item_templates().items() if record.get("item_type") == "weapon"}
 
 
 @lru_cache(maxsize=1)
 def get_general_item_templates() -> Dict[str, Dict[str, Any]]:
-    records = fetch_all("SELECT * FROM item_templates WHERE item_type <> 'weapon'")
-    return {record["item_template_id"]: record for record in records}
+    # Mirrors SQL's `item_type <> 'weapon'`, which also excludes NULL item types.
+    return {
+        key: record
+        for key, record in _all_item_templates().items()
+        if record.get("item_type") is not None and record["item_type"] != "weapon"
+    }
 
 
 def list_item_instances_for_room(room_id: int) -> List[Dict[str, Any]]:
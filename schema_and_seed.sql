@@ -289,6 +289,10 @@ CREATE TABLE IF NOT EXISTS active_effects (
     effect_data_json JSON
 );
 
+-- Lookup indexes (accounts.username and characters.name are already UNIQUE)
+CREATE INDEX IF NOT EXISTS idx_rooms_zone_coords ON rooms (zone_id, x_coord, y_coord);
+CREATE INDEX IF NOT EXISTS idx_characters_account_created ON characters (account_id, created_at);
+
 -- Zones seed data
 INSERT INTO zones (zone_id, name, description_short, description_long, zone_type, recommended_level_min, recommended_level_max, is_safe_zone) VALUES ('village', 'Greyford Village', 'A frontier village with warpstone access to nearby dungeons.', 'Greyford Village bustles with traders and adventurers preparing to explore the surrounding wilds.', 'settlement', 1, 3, 1) ON DUPLICATE KEY UPDATE name=VALUES(name), description_short=VALUES(description_short), description_long=VALUES(description_long), zone_type=VALUES(zone_type), recommended_level_min=VALUES(recommended_level_min), recommended_level_max=VALUES(recommended_level_max), is_safe_zone=VALUES(is_safe_zone);
 INSERT INTO zones (zone_id, name, description_short, description_long, zone_type, recommended_level_min, recommended_level_max, is_safe_zone) VALUES ('dungeon_1', 'Old Mine', 'An abandoned mine infested with vermin and goblins.', 'Collapsed tunnels and hidden warpstones criss-cross the old mine''s upper levels.', 'dungeon', 1, 2, 0) ON DUPLICATE KEY UPDATE name=VALUES(name), description_short=VALUES(description_short), description_long=VALUES(description_long), zone_type=VALUES(zone_type), recommended_level_min=VALUES(recommended_level_min), recommended_level_max=VALUES(recommended_level_max), is_safe_zone=VALUES(is_safe_zone);
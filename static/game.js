@@ -106,7 +106,26 @@ socket.on("connected", (data) => {
   }
 });
 
+let roomState = null;
+let roomStateRev = 0;
+
 socket.on("room_state", (data) => {
+  roomState = data;
+  roomStateRev = data.rev || 0;
+  renderRoomState(data);
+});
+
+socket.on("room_state_patch", (patch) => {
+  if (!roomState || !patch || patch.base !== roomStateRev) {
+    socket.emit("resync");
+    return;
+  }
+  roomState = Object.assign({}, roomState, patch.changes || {});
+  roomStateRev = patch.rev;
+  renderRoomState(roomState);
+});
+
+function renderRoomState(data) {
   roomNameEl.textContent = data.room_name;
   roomDescEl.textContent = data.description;
   coordsEl.textContent = `Position: (${data.x}, ${data.y})`;
@@ -128,7 +147,7 @@ socket.on("room_state", (data) => {
   renderLootList(data.loot || []);
   renderDoorList(data.doors || []);
   renderWarpStone(data.warp_stone || null);
-});
+}
 
 socket.on("system_message", (data) => {
   if (data && data.text) {
@@ -136,6 +155,19 @@ socket.on("system_message", (data) => {
   }
 });
 
+socket.on("system_messages", (data) => {
+  ((data && data.texts) || []).forEach((text) => {
+    if (text) addMessage(text, "system");
+  });
+});
+
+socket.on("batch", (packets) => {
+  (packets || []).forEach((packet) => {
+    if (!packet || !packet.event) return;
+    socket.listeners(packet.event).forEach((listener) => listener(packet.data));
+  });
+});
+
 socket.on("chat_message", (data) => {
   if (!data) return;
   const from = data.from || "??";
@@ -0,0 +1,133 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils  # noqa: E402
+
+# app spawns the world's mobs at import time; start the tests with an empty world instead.
+db_utils.list_zone_ids = lambda: []
+
+import app as game  # noqa: E402  (app monkey-patches eventlet on import)
+
+WIDTH, HEIGHT = 3, 2
+
+
+def _room(x, y):
+    return {
+        "room_id": y * WIDTH + x + 1,
+        "zone_id": "village",
+        "name": f"Room {x},{y}",
+        "description": "A plain test room.",
+        "x": x,
+        "y": y,
+        "is_starting": (x, y) == (0, 0),
+        "is_safe": False,
+    }
+
+
+WORLD = {
+    "zone_id": "village",
+    "name": "Village",
+    "map": [[_room(x, y) for x in range(WIDTH)] for y in range(HEIGHT)],
+    "width": WIDTH,
+    "height": HEIGHT,
+    "start": (0, 0),
+}
+
+WEAPONS = {
+    "unarmed": {"item_template_id": "unarmed", "name": "Unarmed", "damage_dice": "1d1", "damage_type": "bludgeoning"},
+    "longsword": {"item_template_id": "longsword", "name": "Longsword", "damage_dice": "1d8", "damage_type": "slashing"},
+}
+
+
+class FakeDatabase:
+    """In-memory stand-in for the MariaDB tables the game touches."""
+
+    def __init__(self):
+        self.characters = {}
+
+    def add_character(self, character_id, name, current_hp=12):
+        self.characters[character_id] = {
+            "character_id": character_id,
+            "account_id": 1,
+            "name": name,
+            "species": "Human",
+            "class": "Fighter",
+            "str_score": 14,
+            "dex_score": 12,
+            "con_score": 12,
+            "int_score": 10,
+            "wis_score": 10,
+            "cha_score": 10,
+            "max_hp": 12,
+            "current_hp": current_hp,
+            "weapon_inventory": '["longsword"]',
+            "equipped_weapon": "longsword",
+            "item_inventory": "[]",
+            "level": 1,
+            "xp": 0,
+            "coin_gp": 0,
+        }
+
+    def fetch_one(self, query, **params):
+        if "FROM characters" in query and "character_id" in params:
+            record = self.characters.get(params["character_id"])
+            return dict(record) if record else None
+        return None
+
+    def execute(self, query, **params):
+        return 1
+
+    def execute_many(self, query, rows):
+        rows = list(rows)
+        for row in rows:
+            record = self.characters.get(row["character_id"])
+            if record and "current_hp" in row:
+                record["current_hp"] = row["current_hp"]
+        return len(rows)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(db_utils, "fetch_one", database.fetch_one)
+    monkeypatch.setattr(db_utils, "execute", database.execute)
+    monkeypatch.setattr(db_utils, "execute_many", database.execute_many)
+    monkeypatch.setattr(db_utils, "list_zone_ids", lambda: ["village"])
+    monkeypatch.setattr(db_utils, "get_world", lambda zone: WORLD if zone == "village" else None)
+    monkeypatch.setattr(db_utils, "get_room_by_coords", lambda zone, x, y: {"room_id": y * WIDTH + x + 1})
+    monkeypatch.setattr(db_utils, "get_weapon_templates", lambda: WEAPONS)
+    monkeypatch.setattr(db_utils, "get_general_item_templates", lambda: {})
+    monkeypatch.setattr(db_utils, "get_item_template", lambda key: None)
+    # Tests drive flushes themselves; keep the background flusher from starting.
+    monkeypatch.setattr(game, "_character_flush_task", object())
+    for registry in (game.players, game.sid_to_name, game.room_occupants, game._dirty_characters):
+        registry.clear()
+    yield database
+    for registry in (game.players, game.sid_to_name, game.room_occupants, game._dirty_characters):
+        registry.clear()
+
+
+@pytest.fixture
+def connect(fake_db):
+    clients = []
+
+    def _connect(character_id, name, join=True):
+        http = game.app.test_client()
+        with http.session_transaction() as flask_session:
+            flask_session["account_id"] = 1
+            flask_session["character_id"] = character_id
+            flask_session["character_name"] = name
+        client = game.socketio.test_client(game.app, flask_test_client=http)
+        clients.append(client)
+        if join:
+            client.emit("join_game")
+        return client
+
+    yield _connect
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
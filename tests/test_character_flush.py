@@ -0,0 +1,46 @@
+import eventlet
+
+import app as game
+import db_utils
+
+
+def test_join_during_flush_sees_queued_hp(fake_db, connect, monkeypatch):
+    fake_db.add_character(1, "Alice", current_hp=12)
+    game._dirty_characters[1] = {"current_hp": 4}
+    commit = fake_db.execute_many
+
+    def slow_execute_many(query, rows):
+        rows = list(rows)
+        eventlet.sleep(0.05)  # yield mid-write, as PyMySQL does under eventlet
+        return commit(query, rows)
+
+    monkeypatch.setattr(db_utils, "execute_many", slow_execute_many)
+    flush = eventlet.spawn(game.flush_dirty_characters)
+    eventlet.sleep(0.01)
+
+    connect(1, "Alice")
+    flush.wait()
+
+    assert game.players["Alice"]["hp"] == 4
+    assert fake_db.characters[1]["current_hp"] == 4
+    assert 1 not in game._dirty_characters
+
+
+def test_flush_keeps_values_queued_during_the_write(fake_db, monkeypatch):
+    fake_db.add_character(1, "Alice")
+    game._dirty_characters[1] = {"current_hp": 4}
+    commit = fake_db.execute_many
+
+    def slow_execute_many(query, rows):
+        rows = list(rows)
+        eventlet.sleep(0.05)
+        return commit(query, rows)
+
+    monkeypatch.setattr(db_utils, "execute_many", slow_execute_many)
+    flush = eventlet.spawn(game.flush_dirty_characters)
+    eventlet.sleep(0.01)
+    game.queue_character_current_hp(1, 9)
+    flush.wait()
+
+    assert fake_db.characters[1]["current_hp"] == 4
+    assert game._dirty_characters[1] == {"current_hp": 9}
@@ -0,0 +1,39 @@
+from flask import request
+
+import app as game
+
+
+@game.socketio.on("test_mixed_emits")
+def _mixed_emits():
+    room = game.room_name("village", 0, 0)
+    with game.batched_emits():
+        game.send_event("direct_1", 1, to=request.sid)
+        game.send_event("direct_2", 2, to=request.sid)
+        game.send_event("room_1", 3, room=room)
+        game.send_event("direct_3", 4, to=request.sid)
+        game.send_event("everyone_1", 5)
+
+
+def _frames(client):
+    frames = []
+    for packet in client.get_received():
+        if packet["name"] == "batch":
+            frames.append([(item["event"], item["data"]) for item in packet["args"][0]])
+        else:
+            frames.append([(packet["name"], packet["args"][0])])
+    return frames
+
+
+def test_batched_emits_keep_emission_order_across_targets(fake_db, connect):
+    fake_db.add_character(1, "Alice")
+    client = connect(1, "Alice")
+    client.get_received()
+
+    client.emit("test_mixed_emits")
+
+    assert _frames(client) == [
+        [("direct_1", 1), ("direct_2", 2)],
+        [("room_1", 3)],
+        [("direct_3", 4)],
+        [("everyone_1", 5)],
+    ]
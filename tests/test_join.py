@@ -0,0 +1,19 @@
+import app as game
+
+
+def test_reconnect_keeps_the_live_player_object(fake_db, connect):
+    fake_db.add_character(1, "Alice")
+    first = connect(1, "Alice")
+    live = game.players["Alice"]
+    old_sid = live["sid"]
+
+    connect(1, "Alice")
+
+    assert game.players["Alice"] is live
+    assert live["sid"] != old_sid
+    assert old_sid not in game.sid_to_name
+    assert game.sid_to_name[live["sid"]] == "Alice"
+
+    # The superseded socket closing must not log the reconnected player out.
+    first.disconnect()
+    assert game.players.get("Alice") is live
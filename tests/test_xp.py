@@ -0,0 +1,15 @@
+import app as game
+
+
+def test_distribute_xp_splits_by_damage():
+    assert game.distribute_xp({"a": 3, "b": 1}, 8) == {"a": 6, "b": 2}
+
+
+def test_distribute_xp_ties_go_to_earliest_contributor():
+    assert game.distribute_xp({"a": 1, "b": 1, "c": 1}, 10) == {"a": 4, "b": 3, "c": 3}
+    assert game.distribute_xp({"c": 1, "b": 1, "a": 1}, 11) == {"c": 4, "b": 4, "a": 3}
+
+
+def test_distribute_xp_ignores_non_contributors():
+    assert game.distribute_xp({"a": 0, "b": 2}, 5) == {"b": 5}
+    assert game.distribute_xp({"a": 2}, 0) == {}